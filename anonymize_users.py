@@ -1,92 +1,195 @@
-import pandas as pd
-import random
-from faker import Faker
-from collections import defaultdict
+import os
+import argparse
+import storage
+import metrics
+
+NAME_MAPPING_PATH = "data/name_mapping.csv"
+FAKER_SEED = 42
 
-# Load original expenses data
-df = pd.read_csv("data/expenses.csv")
 
 # Step 1: Normalize and clean friend names
-df["paid_by"] = df["paid_by"].astype(str)  # Avoid NaN issues
-df["paid_by_clean"] = df["paid_by"].str.strip().str.lower()
-
-# Check for null or empty cleaned names before mapping
-null_or_empty = df["paid_by_clean"].isnull().sum() + (df["paid_by_clean"] == "").sum()
-print(f"⚠️ Rows with null or empty 'paid_by_clean': {null_or_empty}")
-
-# Step 2: Extract unique cleaned names (excluding empty strings)
-unique_clean_names = df["paid_by_clean"].dropna()
-unique_clean_names = unique_clean_names[unique_clean_names != ""].unique()
-print(f"🔍 Found {len(unique_clean_names)} unique friend names.")
-
-# Step 3: Generate unique fake names using Faker
-fake = Faker()
-Faker.seed(42)
-random.seed(42)
-
-fake_names_pool = set()
-while len(fake_names_pool) < len(unique_clean_names):
-    fake_names_pool.add(fake.first_name())
-
-fake_names_pool = list(fake_names_pool)
-random.shuffle(fake_names_pool)
-
-# Step 4: Create one-to-one mapping from cleaned name to fake name
-name_map = dict(zip(unique_clean_names, fake_names_pool))
-
-# Step 4.1: Check for cleaned names missing from mapping (should be none)
-missing_in_map = set(df["paid_by_clean"].unique()) - set(name_map.keys())
-missing_in_map = {name for name in missing_in_map if name not in [None, ""]}
-print(f"⚠️ Cleaned names missing from mapping (should be empty): {missing_in_map}")
-
-# Step 5: Apply fake names to original DataFrame using cleaned names
-# For any missing or empty cleaned names, map to "Unknown" or leave as is
-def map_name(x):
-    if x in name_map:
-        return name_map[x]
+def clean_names(names):
+    return names.astype("string").fillna("").str.strip().str.lower()
+
+
+# Step 2-4: Load the persisted mapping and mint fake names only for new people
+def load_name_map(path=NAME_MAPPING_PATH):
+    import pandas as pd
+
+    if not os.path.exists(path):
+        return {}
+    mapping = pd.read_csv(path, keep_default_na=False)
+    return dict(zip(mapping["Real Name (cleaned)"], mapping["Fake Name"]))
+
+
+def save_name_map(name_map, path=NAME_MAPPING_PATH):
+    import pandas as pd
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pd.DataFrame({
+        "Real Name (cleaned)": list(name_map.keys()),
+        "Fake Name": list(name_map.values())
+    }).to_csv(path, index=False)
+
+
+def extend_name_map(name_map, clean_unique_names):
+    """Add a unique fake first name for every cleaned name not mapped yet; existing entries never change."""
+    from faker import Faker
+
+    new_names = sorted(n for n in set(clean_unique_names) - set(name_map) if n != "")
+    if not new_names:
+        return []
+
+    # Seed on the map size so the same sequence of batches always mints the same names
+    fake = Faker()
+    fake.seed_instance(FAKER_SEED + len(name_map))
+    used = set(name_map.values())
+    for real in new_names:
+        fake_name = fake.first_name()
+        while fake_name in used:
+            fake_name = fake.first_name()
+        used.add(fake_name)
+        name_map[real] = fake_name
+    return new_names
+
+
+# Step 5: Apply fake names with one lookup per distinct name
+def anonymize_frame(df, name_map):
+    """Return (anonymized copy of df, cleaned names) after extending name_map with any new people."""
+    import pandas as pd
+
+    clean = clean_names(df["paid_by"])
+    codes, uniques = pd.factorize(clean)
+    new_names = extend_name_map(name_map, uniques)
+    if new_names:
+        print(f"🆕 Minted fake names for {len(new_names)} new friends.")
+
+    fake_uniques = pd.Series(uniques).map(name_map).fillna("Unknown").to_numpy(dtype=object)
+    df_anonymized = df.copy()
+    df_anonymized["paid_by"] = fake_uniques[codes]
+    return df_anonymized, clean
+
+
+# Step 6-7: Validate counts and one-to-one mapping
+def validate(clean, anonymized, name_map):
+    import pandas as pd
+
+    real_counts = clean.value_counts()
+    expected = real_counts.groupby(real_counts.index.map(name_map).fillna("Unknown")).sum()
+    fake_counts = pd.Series(anonymized).value_counts()
+    diff = expected.sub(fake_counts, fill_value=0)
+    mismatches = diff[diff != 0]
+    for fake_name, delta in mismatches.items():
+        print(f"⚠️ Mismatch for '{fake_name}': expected-actual={int(delta)}")
+
+    fake_names = pd.Series(name_map)
+    duplicated = fake_names[fake_names.duplicated(keep=False)]
+    for fake_name, real_names in duplicated.groupby(duplicated).groups.items():
+        print(f"❗ Duplicate fake name: {fake_name} is mapped to multiple real names: {list(real_names)}")
+
+    if mismatches.empty and duplicated.empty:
+        print("✅ All name mappings are consistent!")
+    return mismatches.empty and duplicated.empty
+
+
+def anonymize_full(input_name, output_name, name_map):
+    with metrics.step("read") as entry:
+        df = storage.read_table(input_name)
+        entry["rows"] = len(df)
+    empty = (clean_names(df["paid_by"]) == "").sum()
+    print(f"⚠️ Rows with null or empty 'paid_by': {empty}")
+
+    with metrics.step("anonymize", rows=len(df)):
+        df_anonymized, clean = anonymize_frame(df, name_map)
+    print("\n🧪 Validating real vs fake name counts...")
+    with metrics.step("validate", rows=len(df)):
+        validate(clean, df_anonymized["paid_by"], name_map)
+    with metrics.step("write", rows=len(df)):
+        return storage.write_table(df_anonymized, output_name)
+
+
+def anonymize_incremental(input_name, output_name, name_map):
+    """
+    Only anonymize rows whose (id, updated_at) is not already in the output.
+
+    Previously anonymized rows are carried over untouched and rows that no longer
+    exist in the input (deleted upstream) are dropped.
+    """
+    import pandas as pd
+
+    key = ["id", "updated_at"]
+    with metrics.step("read") as entry:
+        df = storage.read_table(input_name)
+        existing_path, _ = storage.resolve(output_name)
+        existing = storage.read_table(output_name) if os.path.exists(existing_path) else None
+        entry["rows"] = len(df)
+    if existing is None or not set(key) <= set(df.columns) or not set(key) <= set(existing.columns):
+        print("ℹ️ No id-keyed anonymized output yet, anonymizing everything.")
+        return anonymize_full(input_name, output_name, name_map)
+
+    seen = pd.MultiIndex.from_frame(existing[key])
+    is_new = ~pd.MultiIndex.from_frame(df[key]).isin(seen)
+    changed = df[is_new]
+    kept = existing[existing["id"].isin(df["id"]) & ~existing["id"].isin(changed["id"])]
+    print(f"🔁 Anonymizing {len(changed)} new/changed rows, keeping {len(kept)} existing rows.")
+
+    with metrics.step("anonymize", rows=len(changed)):
+        df_changed, clean = anonymize_frame(changed, name_map)
+    with metrics.step("validate", rows=len(changed)):
+        validate(clean, df_changed["paid_by"], name_map)
+    combined = pd.concat([kept, df_changed], ignore_index=True)
+    combined = combined.sort_values(["date", "id"], ascending=False)
+    with metrics.step("write", rows=len(combined)):
+        return storage.write_table(combined, output_name)
+
+
+def anonymize_stream(input_name, output_name, name_map, chunksize):
+    """Anonymize chunk by chunk and append to the CSV output, for inputs larger than memory."""
+    output_path = os.path.splitext(storage.resolve(output_name, "csv")[0])[0] + ".csv"
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    rows = 0
+    for i, chunk in enumerate(storage.iter_table(input_name, chunksize)):
+        with metrics.step("anonymize", rows=len(chunk)):
+            df_anonymized, _ = anonymize_frame(chunk, name_map)
+        with metrics.step("write", rows=len(chunk)):
+            df_anonymized.to_csv(output_path, mode="a", index=False, header=i == 0, date_format=storage.DATE_FORMAT)
+        rows += len(chunk)
+        print(f"🧩 Chunk {i + 1} done ({rows} rows)")
+    return output_path
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Replace friend names with stable fake names.")
+    parser.add_argument("--input", default="expenses", help="Dataset name or CSV/Parquet path.")
+    parser.add_argument("--output", default="expenses_anonymized", help="Dataset name or CSV/Parquet path.")
+    parser.add_argument("--mapping", default=NAME_MAPPING_PATH)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--incremental", action="store_true",
+                      help="Only anonymize rows added or changed since the last run (needs an id column).")
+    mode.add_argument("--chunksize", type=int, default=None,
+                      help="Stream the input in chunks of this many rows.")
+    args = parser.parse_args(argv)
+    metrics.start_run("anonymize")
+    metrics.set_info(mode="stream" if args.chunksize else "incremental" if args.incremental else "full")
+
+    name_map = load_name_map(args.mapping)
+    print(f"🔍 Loaded {len(name_map)} existing name mappings from {args.mapping}")
+
+    if args.chunksize:
+        output_path = anonymize_stream(args.input, args.output, name_map, args.chunksize)
+    elif args.incremental:
+        output_path = anonymize_incremental(args.input, args.output, name_map)
     else:
-        return "Unknown"
-
-df["paid_by_anon"] = df["paid_by_clean"].apply(map_name)
-
-# Step 6: Validation of counts
-print("\n🧪 Validating real vs fake name counts...")
-errors_found = False
-real_counts = df["paid_by_clean"].value_counts()
-fake_counts = df["paid_by_anon"].value_counts()
-
-for real_clean, fake_name in name_map.items():
-    real_count = real_counts.get(real_clean, 0)
-    fake_count = fake_counts.get(fake_name, 0)
-    if real_count != fake_count:
-        print(f"⚠️ Mismatch: '{real_clean}' → '{fake_name}': real={real_count}, fake={fake_count}")
-        errors_found = True
-
-if not errors_found:
-    print("✅ All name mappings are consistent!")
-
-# Step 7: Detect any duplicate fake name usage
-reverse_map = defaultdict(list)
-for real, fake in name_map.items():
-    reverse_map[fake].append(real)
-
-for fake_name, real_names in reverse_map.items():
-    if len(real_names) > 1:
-        print(f"❗ Duplicate fake name: {fake_name} is mapped to multiple real names: {real_names}")
-
-# Step 8: Build anonymized dataframe with clean fake names
-df_anonymized = df.copy()
-df_anonymized["paid_by"] = df["paid_by_anon"]  # Override real with fake
-df_anonymized = df_anonymized.drop(columns=["paid_by_clean", "paid_by_anon"])
-
-# Step 9: Save anonymized version
-df_anonymized.to_csv("data/expenses_anonymized.csv", index=False)
-print("📁 Saved anonymized dataset to 'data/expenses_anonymized.csv'")
-
-# Step 10: Save name mapping
-name_mapping_df = pd.DataFrame({
-    "Real Name (cleaned)": list(name_map.keys()),
-    "Fake Name": list(name_map.values())
-})
-name_mapping_df.to_csv("data/name_mapping.csv", index=False)
-print("📁 Saved mapping to 'data/name_mapping.csv'")
+        output_path = anonymize_full(args.input, args.output, name_map)
+
+    # Step 9: Save anonymized version
+    print(f"📁 Saved anonymized dataset to '{output_path}'")
+
+    # Step 10: Save name mapping
+    save_name_map(name_map, args.mapping)
+    print(f"📁 Saved mapping to '{args.mapping}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import os
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+import faiss
+
+import storage
+from benchmark_suite import HashingEncoder, first_existing, profile_expenses, synthetic_expenses
+from example_index import index_factory_string, set_search_params, vote
+
+SWEEPS = {
+    "ivf": ("nprobe", [1, 2, 4, 8, 16, 32, 64]),
+    "hnsw": ("ef_search", [16, 32, 64, 128, 256]),
+    "ivfpq": ("nprobe", [1, 2, 4, 8, 16, 32, 64]),
+}
+
+
+def unique_vectors(encoder, texts):
+    texts = list(dict.fromkeys(texts))
+    return texts, np.ascontiguousarray(encoder.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+
+def timed_search(index, queries, k):
+    index.search(queries[:10], k)
+    start = time.perf_counter()
+    scores, ids = index.search(queries, k)
+    return scores, ids, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def recall_at_k(ids, truth):
+    hits = [len(set(row) & set(true_row)) for row, true_row in zip(ids, truth)]
+    return float(np.mean(hits)) / truth.shape[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall vs latency of the approximate example index modes.")
+    parser.add_argument("--source", default=first_existing(storage.resolve("expenses")[0], "expenses.csv"))
+    parser.add_argument("--examples", default=first_existing(storage.CATEGORY_EXAMPLES_PATH, "category_examples.csv"))
+    parser.add_argument("--references", type=int, default=200_000, help="Synthetic labeled-history rows to index.")
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--voting", choices=("majority", "weighted"), default="majority")
+    parser.add_argument("--model", default="stub", help="'stub' for the hashing encoder, or a model name/path.")
+    parser.add_argument("--output", default=os.path.join(storage.DATA_DIR, "ann_recall.csv"))
+    args = parser.parse_args()
+
+    if args.model == "stub":
+        encoder = HashingEncoder()
+    else:
+        from encoders import load_model
+        encoder = load_model(args.model)
+
+    # Labeled history stand-in: synthetic expenses labeled by their nearest category example
+    profile = profile_expenses(storage.read_table(args.source))
+    df_examples = pd.read_csv(args.examples)
+    example_vectors = np.asarray(encoder.encode(df_examples["example"].tolist(), normalize_embeddings=True))
+    ref_texts, ref_vectors = unique_vectors(encoder, synthetic_expenses(profile, args.references, seed=1)["description"])
+    ref_labels = df_examples["category"].to_numpy(dtype=object)[np.argmax(ref_vectors @ example_vectors.T, axis=1)]
+    ref_texts = np.array(ref_texts, dtype=object)
+    _, query_vectors = unique_vectors(encoder, synthetic_expenses(profile, args.queries, seed=2)["description"])
+    ids = np.arange(len(ref_vectors), dtype=np.int64)
+    dim = ref_vectors.shape[1]
+    print(f"📚 {len(ref_vectors)} reference vectors, {len(query_vectors)} queries, k={args.k}, dim={dim}")
+
+    def labels_for(neighbour_ids, scores):
+        safe = np.maximum(neighbour_ids, 0)
+        categories = np.where(neighbour_ids >= 0, ref_labels[safe], None)
+        examples = np.where(neighbour_ids >= 0, ref_texts[safe], None)
+        return vote(scores, categories, examples, args.voting)[1]
+
+    exact = faiss.index_factory(dim, "IDMap2,Flat", faiss.METRIC_INNER_PRODUCT)
+    exact.add_with_ids(ref_vectors, ids)
+    exact_scores, exact_ids, exact_ms = timed_search(exact, query_vectors, args.k)
+    exact_labels = labels_for(exact_ids, exact_scores)
+    rows = [{"mode": "flat", "param": "", "value": "", "build_s": 0.0, "ms_per_query": round(exact_ms, 4),
+             "speedup": 1.0, f"recall@{args.k}": 1.0, "label_agreement": 1.0,
+             "index_mb": round(faiss.serialize_index(exact).nbytes / 1e6, 1)}]
+
+    for mode, (param, values) in SWEEPS.items():
+        factory = index_factory_string(mode, len(ref_vectors), dim)
+        start = time.perf_counter()
+        index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+        if not index.is_trained:
+            index.train(ref_vectors)
+        index.add_with_ids(ref_vectors, ids)
+        build_s = time.perf_counter() - start
+        size_mb = round(faiss.serialize_index(index).nbytes / 1e6, 1)
+        for value in values:
+            set_search_params(index, **{param: value})
+            scores, found, ms = timed_search(index, query_vectors, args.k)
+            rows.append({
+                "mode": f"{mode} ({factory})", "param": param, "value": value, "build_s": round(build_s, 2),
+                "ms_per_query": round(ms, 4), "speedup": round(exact_ms / ms, 1),
+                f"recall@{args.k}": round(recall_at_k(found, exact_ids), 4),
+                "label_agreement": round(float((labels_for(found, scores) == exact_labels).mean()), 4),
+                "index_mb": size_mb,
+            })
+
+    report = pd.DataFrame(rows)
+    print("\n📊 Recall vs latency against the exact index:")
+    print(report.to_string(index=False))
+    report.to_csv(args.output, index=False)
+    print(f"📁 Saved report to {args.output}")
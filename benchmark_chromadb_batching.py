@@ -0,0 +1,49 @@
+import time
+import random
+import argparse
+
+import chromadb
+from sentence_transformers import SentenceTransformer
+
+from splitwise_categorizer_with_chromadb import build_collection, classify_descriptions, classify_descriptions_loop
+
+MERCHANTS = ["Costco", "Target", "Amazon", "Chipotle", "Airbnb", "Lyft", "CVS", "Spotify",
+             "Home Depot", "IKEA", "Walgreens", "Dominos", "Safeway", "Uber", "Wine", "Netflix"]
+SUFFIXES = ["", " run", " order", " refund", " for party", " split", " groceries", " tickets"]
+MONTHS = ["jan", "feb", "mar", "apr", "may", "june", "july", "aug", "sep", "oct", "nov", "dec"]
+
+
+def synthetic_descriptions(n, seed=42):
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(MERCHANTS)}{rng.choice(SUFFIXES)} {rng.randint(1, 28)} {rng.choice(MONTHS)} #{rng.randint(0, 9999)}"
+        for _ in range(n)
+    ]
+
+
+def time_rows_per_sec(fn, descriptions):
+    start = time.perf_counter()
+    result = fn(descriptions)
+    elapsed = time.perf_counter() - start
+    return len(descriptions) / elapsed, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of per-row vs batched ChromaDB classification.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma separated row counts.")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    # Plain model on purpose: the embedding cache would hide the per-row encode cost
+    model = SentenceTransformer("all-MiniLM-L6-v2")
+    collection, _ = build_collection(chromadb.Client(), model)
+
+    print(f"{'rows':>8} {'loop rows/s':>12} {'batched rows/s':>15} {'speedup':>8} {'agree':>7}")
+    for n in [int(s) for s in args.sizes.split(",")]:
+        descriptions = synthetic_descriptions(n)
+        loop_rps, (loop_pred, _) = time_rows_per_sec(
+            lambda d: classify_descriptions_loop(d, model, collection), descriptions)
+        batch_rps, (batch_pred, _) = time_rows_per_sec(
+            lambda d: classify_descriptions(d, model, collection, chunk_size=args.chunk_size), descriptions)
+        agree = sum(a == b for a, b in zip(loop_pred, batch_pred)) / n
+        print(f"{n:>8} {loop_rps:>12.1f} {batch_rps:>15.1f} {batch_rps / loop_rps:>7.1f}x {agree:>7.1%}")
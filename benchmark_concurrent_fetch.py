@@ -0,0 +1,121 @@
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from splitwise_client import SplitwiseHTTPClient
+
+# -----------------------------
+# 🧪 Mock Splitwise API with injected latency
+# -----------------------------
+def build_fake_account(n_groups, n_friends, expenses_per_scope, seed=42):
+    rng = random.Random(seed)
+    expenses = {}
+    next_id = 1
+    scopes = {("group_id", g): [] for g in range(1, n_groups + 1)}
+    scopes.update({("friend_id", f): [] for f in range(1, n_friends + 1)})
+    for key in scopes:
+        for _ in range(expenses_per_scope):
+            e = {
+                "id": next_id,
+                "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00Z",
+                "cost": f"{rng.uniform(1, 200):.2f}",
+                "currency_code": "USD",
+                "description": rng.choice(["Walmart", "Rent", "Wine", "Uber", "Dinner"]),
+                "updated_at": "2025-07-01T00:00:00Z",
+                "deleted_at": None,
+                "users": [{"user": {"first_name": "Alex"}}],
+            }
+            expenses[next_id] = e
+            scopes[key].append(e)
+            next_id += 1
+    return scopes
+
+
+def make_handler(scopes, latency, throttle_every):
+    counter = {"n": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, payload, status=200, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            time.sleep(latency)
+            with lock:
+                counter["n"] += 1
+                throttled = throttle_every and counter["n"] % throttle_every == 0
+            if throttled:
+                self.send_json({"error": "rate limited"}, status=429, headers={"Retry-After": "0.2"})
+                return
+
+            url = urllib.parse.urlparse(self.path)
+            params = dict(urllib.parse.parse_qsl(url.query))
+            if url.path.endswith("get_groups"):
+                self.send_json({"groups": [{"id": k[1]} for k in scopes if k[0] == "group_id"]})
+            elif url.path.endswith("get_friends"):
+                self.send_json({"friends": [{"id": k[1]} for k in scopes if k[0] == "friend_id"]})
+            elif url.path.endswith("get_expenses"):
+                key = ("group_id", int(params["group_id"])) if "group_id" in params else ("friend_id", int(params["friend_id"]))
+                offset, limit = int(params.get("offset", 0)), int(params.get("limit", 20))
+                self.send_json({"expenses": scopes[key][offset:offset + limit]})
+            else:
+                self.send_json({"error": "not found"}, status=404)
+
+    return Handler
+
+
+# -----------------------------
+# ⏱️ Serial vs concurrent crawl
+# -----------------------------
+def run_benchmark(n_groups, n_friends, expenses_per_scope, page_size, latency, workers, throttle_every):
+    scopes = build_fake_account(n_groups, n_friends, expenses_per_scope)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(scopes, latency, throttle_every))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/api/v3.0"
+
+    results = {}
+    try:
+        for n_workers in sorted({1, workers}):
+            client = SplitwiseHTTPClient(base_url=base_url, max_workers=n_workers,
+                                         requests_per_second=1000, burst=n_workers)
+            start = time.perf_counter()
+            rows = client.fetch_expenses(page_size=page_size)
+            elapsed = time.perf_counter() - start
+            results[n_workers] = (elapsed, rows)
+            print(f"⏱️ workers={n_workers:<3} expenses={len(rows):<6} time={elapsed:.2f}s")
+    finally:
+        server.shutdown()
+
+    serial, concurrent = results[1], results[workers]
+    assert [r["id"] for r in serial[1]] == [r["id"] for r in concurrent[1]], "merge is not deterministic"
+    print(f"🚀 Speedup: {serial[0] / concurrent[0]:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the concurrent Splitwise fetcher against a local mock API.")
+    parser.add_argument("--groups", type=int, default=30)
+    parser.add_argument("--friends", type=int, default=20)
+    parser.add_argument("--expenses-per-scope", type=int, default=120)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds of injected latency per request.")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--throttle-every", type=int, default=25, help="Answer every Nth request with a 429 (0 disables).")
+    args = parser.parse_args()
+    run_benchmark(args.groups, args.friends, args.expenses_per_scope, args.page_size,
+                  args.latency, args.workers, args.throttle_every)
@@ -0,0 +1,52 @@
+import time
+import argparse
+
+import pandas as pd
+from sentence_transformers import SentenceTransformer
+
+import storage
+from categorize_expenses_vector_db import MODEL_NAME, classify_texts
+from description_dictionary import DescriptionDictionary
+from example_index import ExampleIndex
+
+
+def classify_every_row(descriptions, model, example_index):
+    """The pre-dictionary path: one embedding and one search per row."""
+    desc_embeddings = model.encode(list(descriptions), normalize_embeddings=True)
+    scores, categories, examples = example_index.search(desc_embeddings, k=1)
+    return scores[:, 0], categories[:, 0], examples[:, 0]
+
+
+def timed(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dedup ratio and speedup of the description dictionary.")
+    parser.add_argument("--input", default="expenses", help="Dataset name or CSV/Parquet path.")
+    parser.add_argument("--examples", default=storage.CATEGORY_EXAMPLES_PATH)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    descriptions = storage.read_table(args.input, columns=["description"])["description"].fillna("").astype(str)
+    for normalize in (False, True):
+        stats = DescriptionDictionary(descriptions, normalize=normalize).stats()
+        label = "normalized" if normalize else "exact"
+        print(f"🔁 {label:>10}: {stats['rows']} rows → {stats['unique_normalized']} unique ({stats['dedup_ratio']}x)")
+
+    # Plain model on purpose: the embedding cache would hide the repeated encodes
+    model = SentenceTransformer(MODEL_NAME)
+    example_index = ExampleIndex.load_or_build(pd.read_csv(args.examples), model, MODEL_NAME,
+                                               index_dir="data/example_index_bench")
+
+    rows_s, _ = timed(lambda: classify_every_row(descriptions, model, example_index), args.repeats)
+    exact_s, _ = timed(lambda: classify_texts(descriptions, model, example_index, normalize=False), args.repeats)
+    norm_s, _ = timed(lambda: classify_texts(descriptions, model, example_index, normalize=True), args.repeats)
+    print(f"⏱️ every row: {rows_s:.2f}s")
+    print(f"⏱️ exact dedup: {exact_s:.2f}s ({rows_s / exact_s:.1f}x)")
+    print(f"⏱️ normalized dedup: {norm_s:.2f}s ({rows_s / norm_s:.1f}x)")
@@ -0,0 +1,51 @@
+import os
+import time
+import argparse
+
+import numpy as np
+
+import storage
+from encoders import MODEL_NAME, DEFAULT_BACKEND, BACKENDS, DEFAULT_BATCH_SIZE, load_model
+from parallel_encoder import ShardedEncoder, DEFAULT_SHARD_SIZE
+
+
+def synthetic_descriptions(source, n_rows, seed=42):
+    """Real descriptions with a random suffix so every text is unique, like a backfill of years of history."""
+    rng = np.random.default_rng(seed)
+    picks = source[rng.integers(0, len(source), n_rows)]
+    return [f"{text} #{i}" for i, text in zip(rng.permutation(n_rows), picks)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of sharded multi-process encoding vs a single process.")
+    parser.add_argument("--source", default="expenses", help="Dataset name or CSV/Parquet path.")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--workers", default=f"1,2,4,{os.cpu_count()}")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    source = storage.read_table(args.source, columns=["description"])["description"].fillna("").astype(str).to_numpy()
+    texts = synthetic_descriptions(source, args.rows)
+    print(f"🖥️ {os.cpu_count()} CPUs, {len(texts)} descriptions, backend={args.backend}")
+
+    # Baseline: one process with all cores available to torch's intra-op threads
+    model = load_model(args.model, args.backend)
+    model.encode(texts[:args.batch_size], batch_size=args.batch_size)
+    start = time.perf_counter()
+    reference = np.asarray(model.encode(texts, batch_size=args.batch_size, normalize_embeddings=True))
+    single_s = time.perf_counter() - start
+    print(f"{'workers':>8} {'seconds':>8} {'texts/s':>9} {'speedup':>8}")
+    print(f"{'single':>8} {single_s:>8.2f} {len(texts) / single_s:>9.0f} {1.0:>8.2f}")
+
+    for workers in sorted({int(w) for w in args.workers.split(",")}):
+        with ShardedEncoder(args.model, args.backend, workers, args.shard_size, verbose=False) as sharded:
+            # Warm every worker, not just the first to pick up a shard, so no spawn or model load is timed
+            sharded.warm_up(texts[:args.batch_size], batch_size=args.batch_size)
+            start = time.perf_counter()
+            vectors = sharded.encode(texts, batch_size=args.batch_size, normalize_embeddings=True)
+            elapsed = time.perf_counter() - start
+        assert np.allclose(vectors, reference, atol=1e-4), "sharded results differ from the single-process encode"
+        print(f"{workers:>8} {elapsed:>8.2f} {len(texts) / elapsed:>9.0f} {single_s / elapsed:>8.2f}")
@@ -0,0 +1,59 @@
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+import storage
+from cli import COMMANDS
+
+# Modules whose presence in the import trace means a command paid for a heavy dependency
+HEAVY_MODULES = ("pandas", "pyarrow", "faiss", "chromadb", "torch", "sentence_transformers", "tqdm", "faker",
+                 "requests", "splitwise", "requests_oauthlib")
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def cold_start(command, root, scripts=False):
+    """Run one command with --help under -X importtime; returns (wall ms, import ms, heavy modules loaded)."""
+    if scripts:
+        argv = [os.path.join(root, COMMANDS[command][0] + ".py"), "--help"]
+    else:
+        argv = [os.path.join(root, "cli.py"), command, "--help"]
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime"] + argv, cwd=root, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    import_us = 0
+    loaded = set()
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            import_us += int(match.group(1))
+            loaded.add(match.group(4).split(".")[0])
+    return wall_ms, import_us / 1000, [m for m in HEAVY_MODULES if m in loaded]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start time of every CLI command, measured with -X importtime.")
+    parser.add_argument("--root", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Checkout to measure (e.g. a worktree of an older commit).")
+    parser.add_argument("--scripts", action="store_true",
+                        help="Run each command's script directly instead of going through cli.py.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per command; the fastest is reported.")
+    parser.add_argument("--output", default=os.path.join(storage.DATA_DIR, "startup_times.csv"))
+    args = parser.parse_args()
+
+    rows = []
+    print(f"{'command':<22} {'wall ms':>9} {'import ms':>10}  heavy imports")
+    for command in COMMANDS:
+        runs = [cold_start(command, args.root, args.scripts) for _ in range(args.repeat)]
+        wall_ms, import_ms, heavy = min(runs)
+        rows.append({"command": command, "wall_ms": round(wall_ms, 1), "import_ms": round(import_ms, 1),
+                     "heavy_imports": " ".join(heavy)})
+        print(f"{command:<22} {wall_ms:>9.1f} {import_ms:>10.1f}  {' '.join(heavy) or '-'}")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        f.write("command,wall_ms,import_ms,heavy_imports\n")
+        f.writelines(f"{r['command']},{r['wall_ms']},{r['import_ms']},{r['heavy_imports']}\n" for r in rows)
+    print(f"📁 Saved startup times to {args.output}")
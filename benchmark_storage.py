@@ -0,0 +1,56 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+import storage
+
+
+def directory_size_mb(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 1e6
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files) / 1e6
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def synthetic_frame(source, n_rows, seed=42):
+    """Resample real rows and spread them over a few years of dates."""
+    rng = np.random.default_rng(seed)
+    df = source.iloc[rng.integers(0, len(source), n_rows)].reset_index(drop=True)
+    df["date"] = df["date"].min() + (rng.integers(0, 3 * 365 * 24 * 3600, n_rows) * 1e9).astype("timedelta64[ns]")
+    df["amount"] = rng.uniform(1, 300, n_rows).round(2)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare CSV and partitioned Parquet load time and size.")
+    parser.add_argument("--source", default="expenses_categorized", help="Dataset name or CSV/Parquet path.")
+    parser.add_argument("--sizes", default="100000,1000000")
+    args = parser.parse_args()
+
+    source = storage.read_table(args.source)
+    workdir = tempfile.mkdtemp(prefix="storage-bench-")
+    print(f"{'rows':>9} {'format':>8} {'size MB':>8} {'write s':>8} {'load s':>7} {'description-only s':>19}")
+    try:
+        for n in [int(s) for s in args.sizes.split(",")]:
+            df = synthetic_frame(source, n)
+            for fmt in storage.FORMATS:
+                name = "bench"
+                write_s, path = timed(lambda: storage.write_table(df, name, fmt=fmt, data_dir=workdir))
+                load_s, _ = timed(lambda: storage.read_table(name, fmt=fmt, data_dir=workdir))
+                proj_s, _ = timed(lambda: storage.read_table(name, columns=["description"], fmt=fmt, data_dir=workdir))
+                print(f"{n:>9} {fmt:>8} {directory_size_mb(path):>8.1f} {write_s:>8.2f} {load_s:>7.2f} {proj_s:>19.2f}")
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+    finally:
+        shutil.rmtree(workdir)
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "categorize_expenses_vector_db.py")
+
+
+def write_synthetic_expenses(source_path, n_rows, output_path, seed=42):
+    """Resample real rows so description repetition matches the source data."""
+    source = pd.read_csv(source_path)
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, 100_000):
+        size = min(100_000, n_rows - start)
+        chunk = source.iloc[rng.integers(0, len(source), size)].copy()
+        chunk["amount"] = rng.uniform(1, 300, size).round(2)
+        chunk.to_csv(output_path, mode="a", index=False, header=start == 0)
+
+
+def peak_rss_mb(args, cwd):
+    """Run the categorizer in a child process and return (seconds, peak RSS in MB)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, SCRIPT] + args, cwd=cwd,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    if status != 0:
+        raise RuntimeError(f"categorizer exited with status {status}: {args}")
+    # ru_maxrss is reported in KB on Linux
+    return time.perf_counter() - start, rusage.ru_maxrss / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak memory of full vs streaming categorization.")
+    parser.add_argument("--source", default="data/expenses_anonymized.csv")
+    parser.add_argument("--examples", default=storage.CATEGORY_EXAMPLES_PATH)
+    parser.add_argument("--sizes", default="10000,100000,500000")
+    parser.add_argument("--chunksize", type=int, default=10000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="categorize-bench-")
+    os.makedirs(os.path.join(workdir, "data"))
+    # Share the embedding cache so both modes measure the same amount of model work
+    if os.path.isdir("data/embedding_cache"):
+        shutil.copytree("data/embedding_cache", os.path.join(workdir, "data", "embedding_cache"))
+    examples = os.path.abspath(args.examples)
+
+    print(f"{'rows':>9} {'full MB':>9} {'full s':>8} {'stream MB':>10} {'stream s':>9}")
+    try:
+        for n in [int(s) for s in args.sizes.split(",")]:
+            input_path = os.path.join(workdir, f"expenses_{n}.csv")
+            write_synthetic_expenses(args.source, n, input_path)
+            common = ["--input", input_path, "--examples", examples, "--output", os.path.join(workdir, "out.csv")]
+            full_s, full_mb = peak_rss_mb(common, workdir)
+            stream_s, stream_mb = peak_rss_mb(common + ["--chunksize", str(args.chunksize), "--no-resume"], workdir)
+            print(f"{n:>9} {full_mb:>9.0f} {full_s:>8.1f} {stream_mb:>10.0f} {stream_s:>9.1f}")
+            os.remove(input_path)
+    finally:
+        shutil.rmtree(workdir)
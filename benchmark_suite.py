@@ -0,0 +1,295 @@
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+import storage
+from keyword_rules import KeywordRules, RULES_PATH
+from anonymize_users import anonymize_frame
+from description_dictionary import DescriptionDictionary
+from example_index import ExampleIndex
+from centroid_classifier import evaluate_centroids
+from categorize_expenses_vector_db import categorize
+
+RESULTS_DIR = os.path.join(storage.DATA_DIR, "benchmarks")
+# Vocabulary growth in text stays well under linear; a small export's fit near 1 is capped here
+HEAPS_BETA_MAX = 0.8
+DATE_TOKENS = ["1st july", "june 27", "may", "april 1-may 8", "nov dec", "7/1/25", "2024", "3rd", "sept"]
+
+
+def first_existing(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            return path
+    return paths[-1]
+
+
+# -----------------------------
+# 🧪 Synthetic data
+# -----------------------------
+def profile_expenses(df):
+    """The statistics of a real export that the generator reproduces."""
+    descriptions = df["description"].fillna("").astype(str)
+    counts = descriptions.value_counts()
+    # Heaps' law U(n) = k * n^beta, fitted on growing sub-samples averaged over a few shuffles. A small
+    # export is mostly one-off descriptions and fits beta ~1, which would give every synthetic size the
+    # same dedup ratio, so beta is capped and k re-anchored on the whole export
+    sizes = np.unique(np.geomspace(max(10, len(descriptions) // 20), len(descriptions), 8).astype(int))
+    uniques = np.mean([[len(set(shuffled[:n])) for n in sizes]
+                       for shuffled in (descriptions.sample(frac=1, random_state=seed).to_numpy()
+                                        for seed in range(5))], axis=0)
+    beta = min(float(np.polyfit(np.log(sizes), np.log(uniques), 1)[0]), HEAPS_BETA_MAX)
+    amounts = df["amount"][df["amount"] > 0]
+    dates = pd.to_datetime(df["date"], utc=True)
+    return {
+        "rows": len(df),
+        "descriptions": counts.index.tolist(),
+        "description_counts": counts.to_numpy().tolist(),
+        "heaps_k": len(counts) / len(descriptions) ** beta,
+        "heaps_beta": beta,
+        "vocabulary": sorted({w for d in counts.index for w in d.lower().split() if w.isalpha()}),
+        "log_amount_mean": float(np.log(amounts).mean()),
+        "log_amount_std": float(np.log(amounts).std()),
+        "payer_shares": df["paid_by"].value_counts(normalize=True).to_numpy().tolist(),
+        "currency_shares": df["currency"].value_counts(normalize=True).to_dict(),
+        "span_days": max((dates.max() - dates.min()).days, 1),
+    }
+
+
+def synthetic_expenses(profile, n_rows, seed=42):
+    """
+    Splitwise-shaped rows whose description repetition follows the source data.
+
+    The number of distinct descriptions grows with n_rows along the fitted Heaps'
+    curve; the real descriptions keep their own frequencies and new ones are
+    real descriptions with an extra vocabulary word and/or date token, given
+    frequencies drawn from the real frequency distribution.
+    """
+    rng = np.random.default_rng(seed)
+    real = np.array(profile["descriptions"], dtype=object)
+    real_counts = np.array(profile["description_counts"], dtype=np.float64)
+    n_unique = max(len(real), min(n_rows, int(profile["heaps_k"] * n_rows ** profile["heaps_beta"])))
+    n_new = n_unique - len(real)
+
+    vocabulary = np.array(profile["vocabulary"], dtype=object)
+    bases = real[rng.integers(0, len(real), n_new)]
+    words = vocabulary[rng.integers(0, len(vocabulary), n_new)]
+    dates = np.array(DATE_TOKENS + [""] * len(DATE_TOKENS), dtype=object)[rng.integers(0, 2 * len(DATE_TOKENS), n_new)]
+    new = [f"{b} {w} {d} {i}".strip() if i % 3 == 0 else f"{b} {w} {d}".strip()
+           for i, (b, w, d) in enumerate(zip(bases, words, dates))]
+    pool = np.concatenate([real, np.array(new, dtype=object)])
+    weights = np.concatenate([real_counts, rng.choice(real_counts, n_new)])
+
+    descriptions = pool[rng.choice(len(pool), n_rows, p=weights / weights.sum())]
+    payers = rng.choice(len(profile["payer_shares"]), n_rows, p=profile["payer_shares"])
+    currencies = list(profile["currency_shares"])
+    # More rows means more people splitting, not a longer history: keep the source's date span
+    span_s = profile["span_days"] * 86400
+    dates = pd.Timestamp("2020-01-01", tz="UTC") + pd.to_timedelta(rng.integers(0, span_s, n_rows), unit="s")
+    df = pd.DataFrame({
+        "id": np.arange(1, n_rows + 1),
+        "date": dates,
+        "amount": np.exp(rng.normal(profile["log_amount_mean"], profile["log_amount_std"], n_rows)).round(2),
+        "currency": rng.choice(currencies, n_rows, p=list(profile["currency_shares"].values())),
+        "paid_by": pd.Series(payers).map(lambda i: f"friend {i}"),
+        "description": descriptions,
+    })
+    df["updated_at"] = df["date"].dt.strftime(storage.DATE_FORMAT)
+    return storage.apply_schema(df)
+
+
+# -----------------------------
+# 🧠 Offline encoder
+# -----------------------------
+class HashingEncoder:
+    """
+    Model-free stand-in for SentenceTransformer.encode: a bag of hashed words and
+    character trigrams. Costs are nothing like a transformer's, but it lets every
+    non-model hot path be timed offline and deterministically.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, texts, batch_size=64, normalize_embeddings=False, show_progress_bar=False, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            text = text.lower()
+            tokens = text.split() + [text[i:i + 3] for i in range(max(len(text) - 2, 0))]
+            for token in tokens:
+                h = zlib.crc32(token.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        vectors[:, 0] += 1e-3
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors[0] if single else vectors
+
+
+# -----------------------------
+# ⏱️ Benchmarks
+# -----------------------------
+def timed(fn, repeats=1):
+    best, result = float("inf"), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def chromadb_search(vectors, example_vectors, example_categories, chunk_size=1000):
+    import chromadb
+    client = chromadb.EphemeralClient()
+    name = "benchmark_examples"
+    if name in [c.name for c in client.list_collections()]:
+        client.delete_collection(name)
+    collection = client.create_collection(name, metadata={"hnsw:space": "cosine"})
+    collection.add(ids=[str(i) for i in range(len(example_vectors))], embeddings=example_vectors.tolist(),
+                   metadatas=[{"category": c} for c in example_categories])
+    for start in range(0, len(vectors), chunk_size):
+        collection.query(query_embeddings=vectors[start:start + chunk_size].tolist(), n_results=1,
+                         include=["metadatas", "distances"])
+
+
+def run_size(df, encoder, df_examples, df_test, rules, workdir, args):
+    n = len(df)
+    results = {}
+
+    def record(name, seconds, rows, **extra):
+        results[name] = dict(seconds=round(seconds, 4), rows=rows, rows_per_s=round(rows / max(seconds, 1e-9), 1),
+                             **extra)
+        print(f"{n:>10} {name:<18} {seconds:>9.3f}s {rows / max(seconds, 1e-9):>12.0f} rows/s")
+
+    for fmt in storage.FORMATS if args.parquet else ("csv",):
+        path = storage.write_table(df, "bench", fmt=fmt, data_dir=workdir)
+        seconds, _ = timed(lambda: storage.read_table("bench", fmt=fmt, data_dir=workdir), args.repeats)
+        record(f"{fmt}_load", seconds, n)
+        shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+    seconds, _ = timed(lambda: anonymize_frame(df, {}), args.repeats)
+    record("anonymize", seconds, n)
+
+    seconds, _ = timed(lambda: rules.apply(df["description"]), args.repeats)
+    record("keyword_rules", seconds, n)
+
+    seconds, dictionary = timed(lambda: DescriptionDictionary(df["description"]), args.repeats)
+    record("dedup", seconds, n, unique=len(dictionary), dedup_ratio=dictionary.stats()["dedup_ratio"])
+
+    seconds, vectors = timed(lambda: encoder.encode(dictionary.uniques, normalize_embeddings=True), args.repeats)
+    record("encode", seconds, len(dictionary))
+
+    example_index = ExampleIndex.load_or_build(df_examples, encoder, "benchmark", os.path.join(workdir, "index"))
+    seconds, _ = timed(lambda: example_index.search(vectors, k=1), args.repeats)
+    record("faiss_search", seconds, len(vectors))
+
+    if args.chromadb_max:
+        sample = vectors[:args.chromadb_max]
+        example_vectors = np.asarray(encoder.encode(df_examples["example"].tolist(), normalize_embeddings=True))
+        seconds, _ = timed(lambda: chromadb_search(sample, example_vectors, df_examples["category"].tolist()),
+                           args.repeats)
+        record("chromadb_search", seconds, len(sample))
+
+    seconds, _ = timed(lambda: evaluate_centroids(encoder, df_test, df_examples), args.repeats)
+    record("evaluate", seconds, len(df_test))
+
+    def end_to_end():
+        storage.write_table(df, "e2e_input", fmt="csv", data_dir=workdir)
+        frame = storage.read_table("e2e_input", fmt="csv", data_dir=workdir)
+        frame, _ = anonymize_frame(frame, {})
+        frame = categorize(frame, encoder, example_index)
+        return storage.write_table(frame, "e2e_output", fmt="csv", data_dir=workdir)
+    seconds, _ = timed(end_to_end, args.repeats)
+    record("end_to_end", seconds, n)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"📊 {old['meta']['commit']} → {new['meta']['commit']} (rows/s, higher is better)")
+    print(f"{'rows':>10} {'benchmark':<18} {'before':>12} {'after':>12} {'change':>8}")
+    for size, benchmarks in new["results"].items():
+        for name, result in benchmarks.items():
+            before = old["results"].get(size, {}).get(name)
+            if before is None:
+                continue
+            change = result["rows_per_s"] / max(before["rows_per_s"], 1e-9) - 1
+            print(f"{size:>10} {name:<18} {before['rows_per_s']:>12.0f} {result['rows_per_s']:>12.0f} {change:>+8.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of every hot path on synthetic expense data.")
+    parser.add_argument("--source", default=first_existing(storage.resolve("expenses")[0], "expenses.csv"),
+                        help="Real export whose statistics shape the synthetic data.")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Row counts, e.g. 10000,...,10000000.")
+    parser.add_argument("--model", default="stub",
+                        help="'stub' for the offline hashing encoder, or a model name/path to load for real.")
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--parquet", action="store_true", help="Also time Parquet loads (needs pyarrow).")
+    parser.add_argument("--chromadb-max", type=int, default=20000,
+                        help="Cap on ChromaDB queries per size (0 skips ChromaDB).")
+    parser.add_argument("--output", default=None, help=f"JSON results path (default: {RESULTS_DIR}/<commit>_<time>.json).")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit.")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    profile = profile_expenses(storage.read_table(args.source))
+    df_examples = pd.read_csv(first_existing(storage.CATEGORY_EXAMPLES_PATH, "category_examples.csv"))
+    df_test = pd.read_csv(first_existing(storage.TEST_LABELS_PATH, "test_labels.csv"))
+    rules = KeywordRules.load(RULES_PATH)
+    if args.model == "stub":
+        encoder = HashingEncoder()
+    else:
+        from encoders import load_model
+        encoder = load_model(args.model, args.backend)
+    print(f"🧪 Source {args.source}: {profile['rows']} rows, Heaps beta {profile['heaps_beta']:.2f}, encoder={args.model}")
+
+    meta = {
+        "commit": git_commit(),
+        "started_at": time.strftime(storage.DATE_FORMAT, time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "model": args.model,
+        "backend": args.backend if args.model != "stub" else None,
+        "repeats": args.repeats,
+    }
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="expense-bench-")
+    try:
+        for n in [int(s) for s in args.sizes.split(",")]:
+            df = synthetic_expenses(profile, n)
+            results[str(n)] = run_size(df, encoder, df_examples, df_test, rules, workdir, args)
+    finally:
+        shutil.rmtree(workdir)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{meta['commit'] or 'unknown'}_{meta['started_at'].replace(':', '')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"📁 Saved benchmark results to {output}")
@@ -1,5 +1,6 @@
 import os
-import pandas as pd
+import argparse
+import storage
 
 # Define new example mappings
 category_map = {
@@ -39,13 +40,23 @@ category_map = {
     ]
 }
 
-# Create the directory if it doesn't exist
-os.makedirs("data", exist_ok=True)
 
-# Convert to DataFrame
-rows = [{"category": cat, "example": ex} for cat, ex_list in category_map.items() for ex in ex_list]
-df = pd.DataFrame(rows)
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Write the built-in category examples to the data directory.")
+    parser.parse_args(argv)
+    import pandas as pd
 
-# Save to CSV
-df.to_csv("data/category_examples.csv", index=False)
-print("✅ category_examples.csv successfully saved.")
+    # Create the directory if it doesn't exist
+    os.makedirs(storage.DATA_DIR, exist_ok=True)
+
+    # Convert to DataFrame
+    rows = [{"category": cat, "example": ex} for cat, ex_list in category_map.items() for ex in ex_list]
+    df = pd.DataFrame(rows)
+
+    # Save to CSV
+    df.to_csv(storage.CATEGORY_EXAMPLES_PATH, index=False)
+    print("✅ category_examples.csv successfully saved.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+import storage
+import metrics
+from embedding_cache import CachedEncoder
+from encoders import add_encoder_args
+from example_index import ExampleIndex, INDEX_DIR, load_reference_set
+from review_queue import REVIEW_LABELS_PATH, load_review_labels
+from categorize_expenses_vector_db import MODEL_NAME, LOW_CONFIDENCE_THRESHOLD, classify_texts
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests into one encode + search call.
+
+    A single worker thread owns the model and index. It takes the first queued
+    request, then keeps pulling more until max_batch_size descriptions are
+    gathered or max_wait_ms has passed, classifies them together and resolves
+    each request's future with its own slice of the results. stop() lets it
+    finish the batch in hand and joins it, so nothing encodes while the cache saves.
+    """
+
+    def __init__(self, model, example_index, max_batch_size=64, max_wait_ms=5, idle_save_s=30, overrides=None):
+        self.model = model
+        self.example_index = example_index
+        self.overrides = overrides
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.idle_save_s = idle_save_s
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def submit(self, descriptions):
+        future = Future()
+        self.requests.put((descriptions, future))
+        return future
+
+    def stop(self):
+        self.requests.put(None)
+        self.worker.join()
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            try:
+                first = self.requests.get(timeout=self.idle_save_s)
+            except queue.Empty:
+                # Quiet period: persist newly cached embeddings off the request path
+                self.model.cache.save()
+                continue
+            if first is None:
+                break
+
+            batch = [first]
+            size = len(first[0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self.process(batch)
+
+    def process(self, batch):
+        texts = [t for descriptions, _ in batch for t in descriptions]
+        try:
+            scores, categories, examples = classify_texts(texts, self.model, self.example_index,
+                                                         overrides=self.overrides)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        metrics.count("service_batches")
+
+        start = 0
+        for descriptions, future in batch:
+            end = start + len(descriptions)
+            future.set_result([
+                {
+                    "description": text,
+                    "category": category,
+                    "matched_example": example,
+                    "similarity_score": round(float(score), 4),
+                    "low_confidence_flag": bool(score < LOW_CONFIDENCE_THRESHOLD),
+                }
+                for text, score, category, example in zip(texts[start:end], scores[start:end],
+                                                          categories[start:end], examples[start:end])
+            ])
+            start = end
+
+
+def make_handler(batcher, timeout_s=30):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # Headers and body go out in separate writes; don't let Nagle hold the body back
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self.send_json({"status": "ok", "batches": batcher.batches,
+                                "embedding_cache": batcher.model.cache.stats()})
+            elif self.path == "/metrics" and metrics.current() is not None:
+                metrics.record_cache("embedding", batcher.model.cache.stats())
+                body = metrics.current().to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self.send_json({"error": "not found"}, status=404)
+
+        def do_POST(self):
+            if self.path != "/categorize":
+                self.send_json({"error": "not found"}, status=404)
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if "descriptions" in payload:
+                    descriptions = [str(d) for d in payload["descriptions"]]
+                else:
+                    descriptions = [str(payload["description"])]
+            except (ValueError, KeyError, TypeError):
+                self.send_json({"error": "expected {\"description\": ...} or {\"descriptions\": [...]}"}, status=400)
+                return
+
+            if not descriptions:
+                self.send_json({"results": []})
+                return
+            start = time.perf_counter()
+            try:
+                results = batcher.submit(descriptions).result(timeout=timeout_s)
+            except FutureTimeoutError:
+                metrics.count("request_timeouts")
+                self.send_json({"error": f"no result within {timeout_s}s, try again"}, status=503)
+                return
+            except Exception as e:
+                metrics.count("request_errors")
+                self.send_json({"error": f"categorization failed: {e}"}, status=500)
+                return
+            metrics.observe("request_seconds", time.perf_counter() - start)
+            metrics.count("requests")
+            self.send_json({"results": results})
+
+    return Handler
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Serve warm expense categorization over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--examples", default=storage.CATEGORY_EXAMPLES_PATH)
+    parser.add_argument("--reviewed", default=REVIEW_LABELS_PATH,
+                        help="Reviewed corrections that override matching descriptions ('' to ignore them).")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    add_encoder_args(parser)
+    args = parser.parse_args(argv)
+    metrics.start_run("service")
+    metrics.set_info(backend=args.backend, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+
+    print("🧠 Loading embedding model and example index...")
+    model = CachedEncoder(MODEL_NAME, autosave=False, backend=args.backend, threads=args.threads,
+                          batch_size=args.batch_size)
+    df_examples = load_reference_set(args.examples, reviewed=args.reviewed)
+    example_index = ExampleIndex.load_or_build(df_examples, model, model.model_key, INDEX_DIR)
+    # Pay model load and first-call overhead before accepting traffic
+    model.model.encode(["warm up"])
+
+    batcher = MicroBatcher(model, example_index, args.max_batch_size, args.max_wait_ms,
+                           overrides=load_review_labels(args.reviewed))
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(batcher))
+    print(f"🚀 Serving on http://{args.host}:{args.port} (POST /categorize, GET /health, GET /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+        model.cache.save()
+        model.report()
+
+
+if __name__ == "__main__":
+    main()
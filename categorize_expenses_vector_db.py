@@ -1,69 +1,278 @@
-import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import faiss
+from embedding_cache import CachedEncoder
+from encoders import add_encoder_args
+from parallel_encoder import ShardedEncoder, DEFAULT_SHARD_SIZE
+from example_index import ExampleIndex, INDEX_DIR, INDEX_MODES, VOTING, load_reference_set
+from description_dictionary import DescriptionDictionary, normalize_descriptions
+from review_queue import REVIEW_LABELS_PATH, load_review_labels
+import storage
+import metrics
+from collections import Counter
+import argparse
+import json
 import os
 
-# -----------------------------
-# 📥 Step 1: Load anonymized expenses
-# -----------------------------
-print("📥 Loading expense data...")
-df = pd.read_csv("data/expenses_anonymized.csv")
-descriptions = df["description"].fillna("").astype(str).tolist()
-
-# -----------------------------
-# 📁 Step 2: Load category examples
-# -----------------------------
-print("📁 Loading category examples...")
-df_examples = pd.read_csv("category_examples.csv")
-examples = df_examples["example"].fillna("").astype(str).tolist()
-categories = df_examples["category"].tolist()
-
-# -----------------------------
-# 🧠 Step 3: Load embedding model
-# -----------------------------
-print("🧠 Loading embedding model...")
-model = SentenceTransformer("all-MiniLM-L6-v2")
-example_embeddings = model.encode(examples, normalize_embeddings=True)
-
-# -----------------------------
-# ⚡ Step 4: Build FAISS index
-# -----------------------------
-print("⚡ Building vector index...")
-dimension = example_embeddings.shape[1]
-index = faiss.IndexFlatIP(dimension)
-index.add(example_embeddings)
-
-# -----------------------------
-# 🧭 Step 5: Embed descriptions and classify
-# -----------------------------
-print("🧭 Classifying expense descriptions...")
-desc_embeddings = model.encode(descriptions, normalize_embeddings=True)
-scores, matched_indices = index.search(desc_embeddings, k=1)
-
-# Add confidence flag here
+MODEL_NAME = "all-MiniLM-L6-v2"
 LOW_CONFIDENCE_THRESHOLD = 0.45
-df["low_confidence_flag"] = scores[:, 0] < LOW_CONFIDENCE_THRESHOLD
-
-matched_categories = [categories[i[0]] for i in matched_indices]
-matched_examples = [examples[i[0]] for i in matched_indices]
-
-# -----------------------------
-# 📝 Step 6: Add results to DataFrame
-# -----------------------------
-df["category"] = matched_categories
-df["matched_example"] = matched_examples
-df["similarity_score"] = scores[:, 0]
-
-# -----------------------------
-# 💾 Step 7: Save results
-# -----------------------------
-output_path = "data/expenses_categorized.csv"
-df.to_csv(output_path, index=False)
-print(f"✅ Categorized expenses saved to: {output_path}")
-
-# -----------------------------
-# 📊 Step 8: Preview top categories
-# -----------------------------
-print("\n📊 Top categories by count:")
-print(df["category"].value_counts())
+# Distinct descriptions encoded and searched per block; bounds the live float32 embeddings
+ENCODE_BLOCK_SIZE = 65_536
+
+
+def classify_unique(dictionary, model, example_index, normalize=True, k=1, voting="majority", overrides=None,
+                    block_size=ENCODE_BLOCK_SIZE):
+    """
+    Return per-unique-text (scores, categories, matched examples) for a DescriptionDictionary.
+
+    Texts found in `overrides` ({normalized description: category}, the
+    reviewed corrections) take that category with score 1.0 and are never
+    encoded. The rest are encoded and searched `block_size` texts at a time,
+    so only one block of float32 embeddings is alive however many distinct
+    descriptions there are.
+    """
+    scores = np.ones(len(dictionary), dtype=np.float32)
+    matched_categories = np.full(len(dictionary), None, dtype=object)
+    matched_examples = np.full(len(dictionary), None, dtype=object)
+    pending = np.arange(len(dictionary))
+    if overrides:
+        texts = normalize_descriptions(dictionary.uniques) if not normalize else dictionary.uniques
+        reviewed = np.array([overrides.get(text) for text in texts], dtype=object)
+        hits = reviewed != None  # noqa: E711 - elementwise on an object array
+        matched_categories[hits] = reviewed[hits]
+        matched_examples[hits] = np.asarray(texts, dtype=object)[hits]
+        pending = np.flatnonzero(~hits)
+        metrics.count("review_override_hits", int(hits.sum()))
+    for start in range(0, len(pending), block_size):
+        block = pending[start:start + block_size]
+        with metrics.step("encode", rows=len(block)):
+            desc_embeddings = model.encode([dictionary.uniques[i] for i in block], normalize_embeddings=True)
+        with metrics.step("search", rows=len(block)):
+            (scores[block], matched_categories[block],
+             matched_examples[block]) = example_index.classify(desc_embeddings, k, voting)
+    return scores, matched_categories, matched_examples
+
+
+def classify_texts(descriptions, model, example_index, normalize=True, k=1, voting="majority", overrides=None):
+    """
+    Return (scores, categories, matched examples) for the best example of each description.
+
+    Each distinct (normalized) text is embedded and searched once and the
+    results are broadcast back to every row that shares it. With k > 1 the
+    category is voted over the k nearest examples.
+    """
+    with metrics.step("dedup", rows=len(descriptions)):
+        dictionary = DescriptionDictionary(descriptions, normalize=normalize)
+    scores, matched_categories, matched_examples = classify_unique(dictionary, model, example_index, normalize, k,
+                                                                   voting, overrides)
+    return (dictionary.broadcast(scores), dictionary.broadcast(matched_categories),
+            dictionary.broadcast(matched_examples))
+
+
+def categorize(df, model, example_index, normalize=True, verbose=False, k=1, voting="majority", overrides=None):
+    # -----------------------------
+    # 🧭 Step 5: Embed descriptions and classify
+    # -----------------------------
+    with metrics.step("dedup", rows=len(df)):
+        dictionary = DescriptionDictionary(df["description"], normalize=normalize)
+    if verbose:
+        stats = dictionary.stats()
+        print(f"🔁 {stats['rows']} rows → {stats['unique_normalized']} unique descriptions "
+              f"({stats['dedup_ratio']}x dedup)")
+    scores, matched_categories, matched_examples = classify_unique(dictionary, model, example_index, normalize, k,
+                                                                   voting, overrides)
+    scores = dictionary.broadcast(scores)
+
+    # Add confidence flag here
+    df["low_confidence_flag"] = scores < LOW_CONFIDENCE_THRESHOLD
+
+    # -----------------------------
+    # 📝 Step 6: Add results to DataFrame
+    # -----------------------------
+    # Few distinct categories and examples: store them as categoricals, not one object per row
+    df["category"] = dictionary.broadcast_categorical(matched_categories)
+    df["matched_example"] = dictionary.broadcast_categorical(matched_examples)
+    df["similarity_score"] = scores
+    return df
+
+
+def load_checkpoint(checkpoint_path, input_path, chunksize):
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path, "r") as f:
+        checkpoint = json.load(f)
+    if checkpoint["input"] != input_path or checkpoint["chunksize"] != chunksize:
+        print("⚠️ Checkpoint is for a different input or chunk size, starting over.")
+        return None
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def categorize_streaming(input_name, output_path, model, example_index, chunksize, resume=True, normalize=True,
+                         k=1, voting="majority", overrides=None):
+    """
+    Categorize input_name in fixed-size chunks, appending each finished chunk to the CSV output_path.
+
+    After every chunk the row count, output size and running category counts are
+    checkpointed next to the output, so a crashed run resumes after the last
+    completed chunk and only one chunk is ever held in memory.
+    """
+    import pandas as pd
+
+    checkpoint_path = output_path + ".progress.json"
+    checkpoint = load_checkpoint(checkpoint_path, input_name, chunksize) if resume else None
+    if checkpoint is not None and (not os.path.exists(output_path)
+                                   or os.path.getsize(output_path) < checkpoint["output_bytes"]):
+        # Truncating up to output_bytes would pad the gap with zero bytes
+        print("⚠️ Output is missing or shorter than its checkpoint, starting over.")
+        checkpoint = None
+    if checkpoint is None:
+        checkpoint = {"input": input_name, "chunksize": chunksize, "chunks_done": 0,
+                      "rows_done": 0, "output_bytes": 0, "category_counts": {}}
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    else:
+        print(f"⏩ Resuming after chunk {checkpoint['chunks_done']} ({checkpoint['rows_done']} rows)")
+        # Drop anything a crashed run appended after its last checkpoint
+        with open(output_path, "ab") as f:
+            f.truncate(checkpoint["output_bytes"])
+
+    counts = Counter(checkpoint["category_counts"])
+    chunks = storage.iter_table(input_name, chunksize, skip_rows=checkpoint["rows_done"])
+    while True:
+        with metrics.step("read") as entry:
+            chunk = next(chunks, None)
+            entry["rows"] = 0 if chunk is None else len(chunk)
+        if chunk is None:
+            break
+        chunk = categorize(chunk, model, example_index, normalize=normalize, k=k, voting=voting,
+                           overrides=overrides)
+        with metrics.step("write", rows=len(chunk)), open(output_path, "a", newline="") as f:
+            chunk.to_csv(f, index=False, header=checkpoint["rows_done"] == 0, date_format=storage.DATE_FORMAT)
+
+        counts.update(chunk["category"].tolist())
+        checkpoint["chunks_done"] += 1
+        checkpoint["rows_done"] += len(chunk)
+        checkpoint["output_bytes"] = os.path.getsize(output_path)
+        checkpoint["category_counts"] = dict(counts)
+        save_checkpoint(checkpoint_path, checkpoint)
+        print(f"🧩 Chunk {checkpoint['chunks_done']} done ({checkpoint['rows_done']} rows)")
+
+    os.remove(checkpoint_path)
+    return pd.Series(counts, name="count").sort_values(ascending=False)
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Categorize expenses against category examples with FAISS.")
+    parser.add_argument("--input", default="expenses_anonymized", help="Dataset name or CSV/Parquet path.")
+    parser.add_argument("--output", default="expenses_categorized",
+                        help="Dataset name or CSV/Parquet path (streaming mode always appends CSV).")
+    parser.add_argument("--examples", default=storage.CATEGORY_EXAMPLES_PATH)
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream the input in chunks of this many rows instead of loading it whole.")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Ignore any checkpoint left by an interrupted streaming run.")
+    parser.add_argument("--no-normalize", action="store_true",
+                        help="Classify raw descriptions instead of stripping case, dates and month tokens first.")
+    parser.add_argument("--history", default=None,
+                        help="Human-labeled expenses to add as kNN references, e.g. the test labels or the "
+                             "review log; categorizer output is refused.")
+    parser.add_argument("--reviewed", default=REVIEW_LABELS_PATH,
+                        help="Reviewed corrections that override matching descriptions ('' to ignore them).")
+    parser.add_argument("--index-mode", choices=INDEX_MODES, default="flat",
+                        help="Exact search (flat), exact search over float16/int8 vectors (fp16, sq8) "
+                             "or an approximate index for large reference sets.")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF list count (default ~4*sqrt(n)).")
+    parser.add_argument("--nprobe", type=int, default=16, help="IVF lists visited per query (recall vs speed).")
+    parser.add_argument("--ef-search", type=int, default=64, help="HNSW candidate list size (recall vs speed).")
+    parser.add_argument("--k", type=int, default=1, help="Neighbours to vote over (1 = nearest example wins).")
+    parser.add_argument("--voting", choices=VOTING, default="majority")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Backfill mode: encode uncached descriptions on this many worker processes.")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE,
+                        help="Descriptions per worker task in backfill mode.")
+    add_encoder_args(parser)
+    args = parser.parse_args(argv)
+    metrics.start_run("categorize")
+    metrics.set_info(backend=args.backend, workers=args.workers, chunksize=args.chunksize, index_mode=args.index_mode,
+                     k=args.k, voting=args.voting)
+
+    # -----------------------------
+    # 📁 Step 2: Load category examples
+    # -----------------------------
+    print("📁 Loading category examples...")
+    with metrics.step("load_examples"):
+        df_examples = load_reference_set(args.examples, args.history, reviewed=args.reviewed)
+        overrides = load_review_labels(args.reviewed)
+
+    # -----------------------------
+    # 🧠 Step 3: Load embedding model
+    # -----------------------------
+    print(f"🧠 Loading embedding model ({args.backend})...")
+    sharded = None
+    if args.workers > 1:
+        print(f"🧵 Backfill mode: {args.workers} worker processes, {args.shard_size} descriptions per shard")
+        sharded = ShardedEncoder(MODEL_NAME, args.backend, args.workers, args.shard_size, args.threads)
+    model = CachedEncoder(MODEL_NAME, backend=args.backend, threads=args.threads, batch_size=args.batch_size,
+                          model=sharded)
+
+    # -----------------------------
+    # ⚡ Step 4: Load or update FAISS index
+    # -----------------------------
+    print("⚡ Loading vector index...")
+    with metrics.step("load_index", rows=len(df_examples)):
+        # A history-backed reference set gets its own index so switching back and forth does not churn it
+        index_dir = INDEX_DIR if args.index_mode == "flat" else f"{INDEX_DIR}_{args.index_mode}"
+        if args.history:
+            index_dir += "_history"
+        example_index = ExampleIndex.load_or_build(df_examples, model, model.model_key, index_dir, args.index_mode,
+                                                   args.nlist, args.nprobe, args.ef_search)
+    if example_index.nbytes() is not None:
+        metrics.record_memory("example_index", example_index.nbytes())
+
+    if args.chunksize:
+        print(f"🧭 Streaming {args.input} in chunks of {args.chunksize} rows...")
+        output_path = os.path.splitext(storage.resolve(args.output, "csv")[0])[0] + ".csv"
+        category_counts = categorize_streaming(args.input, output_path, model, example_index,
+                                               args.chunksize, resume=not args.no_resume,
+                                               normalize=not args.no_normalize, k=args.k, voting=args.voting,
+                                               overrides=overrides)
+    else:
+        # -----------------------------
+        # 📥 Step 1: Load anonymized expenses
+        # -----------------------------
+        print("📥 Loading expense data...")
+        with metrics.step("read") as entry:
+            df = storage.read_table(args.input)
+            entry["rows"] = len(df)
+        metrics.record_memory("expenses_frame", df.memory_usage(deep=True).sum())
+
+        print("🧭 Classifying expense descriptions...")
+        df = categorize(df, model, example_index, normalize=not args.no_normalize, verbose=True,
+                        k=args.k, voting=args.voting, overrides=overrides)
+        metrics.record_memory("categorized_frame", df.memory_usage(deep=True).sum())
+
+        # -----------------------------
+        # 💾 Step 7: Save results
+        # -----------------------------
+        with metrics.step("write", rows=len(df)):
+            output_path = storage.write_table(df, args.output)
+        category_counts = df["category"].value_counts()
+    print(f"✅ Categorized expenses saved to: {output_path}")
+
+    # -----------------------------
+    # 📊 Step 8: Preview top categories
+    # -----------------------------
+    print("\n📊 Top categories by count:")
+    print(category_counts)
+    model.report()
+    if sharded is not None:
+        sharded.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import numpy as np
+import metrics
+
+HIGH_CONFIDENCE_THRESHOLD = 0.75
+LOW_CONFIDENCE_THRESHOLD = 0.45
+
+
+def confidence_bucket(scores, high=HIGH_CONFIDENCE_THRESHOLD, low=LOW_CONFIDENCE_THRESHOLD):
+    scores = np.asarray(scores)
+    return np.select([scores >= high, scores >= low], ["High", "Medium"], default="Low")
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class CentroidClassifier:
+    """
+    Cosine-similarity classifier against one mean embedding per category.
+
+    Centroids are stacked into a single unit-normalized matrix so a whole batch
+    is scored with one matrix multiply instead of one cos_sim call per pair.
+    """
+
+    def __init__(self, labels, centroids):
+        self.labels = np.asarray(labels, dtype=object)
+        self.centroids = normalize_rows(centroids)
+
+    @classmethod
+    def from_examples(cls, model, df_examples):
+        labels = df_examples["category"].unique().tolist()
+        example_embeddings = np.asarray(model.encode(df_examples["example"].tolist()), dtype=np.float32)
+        categories = df_examples["category"].to_numpy()
+        centroids = np.stack([example_embeddings[categories == cat].mean(axis=0) for cat in labels])
+        return cls(labels, centroids)
+
+    def scores(self, embeddings):
+        return normalize_rows(embeddings) @ self.centroids.T
+
+    def classify(self, embeddings, top_k=2):
+        """Return predicted labels, scores, margins (top-1 minus top-2), confidence buckets and top-k arrays."""
+        scores = self.scores(embeddings)
+        top_k = min(top_k, scores.shape[1])
+        # argsort on the negated scores is stable, so ties resolve to the first category like the old loop
+        top_idx = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+        top_scores = np.take_along_axis(scores, top_idx, axis=1)
+        best = top_scores[:, 0]
+        margin = best - top_scores[:, 1] if top_k > 1 else best
+        return {
+            "predicted": self.labels[top_idx[:, 0]],
+            "score": best,
+            "margin": margin,
+            "confidence": confidence_bucket(best),
+            "top_labels": self.labels[top_idx],
+            "top_scores": top_scores,
+        }
+
+
+def evaluate_centroids(model, df_test, df_examples):
+    """Classify df_test["description"] against category centroids and mark correct rows."""
+    classifier = CentroidClassifier.from_examples(model, df_examples)
+    desc_embeddings = model.encode(df_test["description"].tolist())
+    result = classifier.classify(desc_embeddings)
+
+    df_test = df_test.copy()
+    df_test["predicted_category"] = result["predicted"]
+    df_test["similarity_score"] = result["score"]
+    df_test["margin"] = result["margin"]
+    df_test["confidence_bucket"] = result["confidence"]
+    df_test["correct"] = df_test["true_category"].str.lower().str.strip() == df_test["predicted_category"].str.lower().str.strip()
+    return df_test
+
+
+def print_evaluation_report(df_test, errors_path="data/eval_errors.csv"):
+    accuracy = df_test["correct"].mean()
+    low_conf_count = (df_test["confidence_bucket"] == "Low").sum()
+    incorrect_count = (~df_test["correct"]).sum()
+    metrics.set_info(accuracy=round(float(accuracy), 4), low_confidence=int(low_conf_count),
+                     incorrect=int(incorrect_count))
+
+    print(f"\n✅ Model Accuracy: {accuracy*100:.2f}%")
+    print(f"⚠️  Low Confidence Predictions (< {LOW_CONFIDENCE_THRESHOLD}): {low_conf_count}")
+    print(f"❌ Incorrect Predictions: {incorrect_count}\n")
+
+    print("📊 Per-Category Accuracy:")
+    print(df_test.groupby("true_category")["correct"].agg(["count", "sum", "mean"]).rename(
+        columns={"sum": "correct", "mean": "accuracy"}).round(2))
+
+    errors_df = df_test[(~df_test["correct"]) | (df_test["confidence_bucket"] == "Low")]
+    errors_df.to_csv(errors_path, index=False)
+    print(f"\n📁 Mismatches/Low confidence saved to: {errors_path}")
+    return errors_df
@@ -0,0 +1,83 @@
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import storage
+from encoders import BACKENDS, MODEL_NAME, DEFAULT_BATCH_SIZE, load_model
+from centroid_classifier import CentroidClassifier, normalize_rows
+
+
+def encode_timed(model, texts, batch_size):
+    # One untimed call so session setup and lazy weight loading are not counted
+    model.encode(texts[:batch_size], batch_size=batch_size)
+    start = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    return np.asarray(vectors, dtype=np.float32), time.perf_counter() - start
+
+
+def nearest_example(test_vectors, example_vectors, example_categories):
+    """Top-1 example match, the way the FAISS and ChromaDB categorizers predict."""
+    return example_categories[np.argmax(test_vectors @ example_vectors.T, axis=1)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accuracy and speed of each embedding backend against the labeled test set.")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--test", default=storage.TEST_LABELS_PATH)
+    parser.add_argument("--examples", default=storage.CATEGORY_EXAMPLES_PATH)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--output", default="data/encoder_parity.csv")
+    args = parser.parse_args()
+
+    df_test = pd.read_csv(args.test)
+    df_examples = pd.read_csv(args.examples)
+    test_texts = df_test["description"].astype(str).tolist()
+    example_texts = df_examples["example"].astype(str).tolist()
+    example_categories = df_examples["category"].to_numpy(dtype=object)
+    truth = df_test["true_category"].to_numpy(dtype=object)
+
+    # fp32 torch is the reference every other backend is compared with
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    if "torch" in backends:
+        backends.remove("torch")
+    backends.insert(0, "torch")
+
+    results = []
+    reference = None
+    for backend in backends:
+        print(f"🧠 Loading {args.model} with backend={backend}...")
+        try:
+            model = load_model(args.model, backend, args.threads)
+        except Exception as e:
+            print(f"⚠️ Skipping {backend}: {e}")
+            continue
+
+        test_vectors, encode_s = encode_timed(model, test_texts, args.batch_size)
+        example_vectors, _ = encode_timed(model, example_texts, args.batch_size)
+        centroid_pred = CentroidClassifier.from_examples(model, df_examples).classify(test_vectors)["predicted"]
+        knn_pred = nearest_example(test_vectors, normalize_rows(example_vectors), example_categories)
+
+        row = {
+            "backend": backend,
+            "texts_per_s": round(len(test_texts) / encode_s, 1),
+            "centroid_accuracy": round(float((centroid_pred == truth).mean()), 4),
+            "nearest_example_accuracy": round(float((knn_pred == truth).mean()), 4),
+        }
+        if reference is None:
+            reference = {"vectors": test_vectors, "centroid": centroid_pred, "knn": knn_pred, "encode_s": encode_s}
+        row["speedup"] = round(reference["encode_s"] / encode_s, 2)
+        row["mean_cosine_vs_torch"] = round(float((test_vectors * reference["vectors"]).sum(axis=1).mean()), 4)
+        row["min_cosine_vs_torch"] = round(float((test_vectors * reference["vectors"]).sum(axis=1).min()), 4)
+        row["prediction_agreement"] = round(float(((centroid_pred == reference["centroid"]).mean()
+                                                   + (knn_pred == reference["knn"]).mean()) / 2), 4)
+        results.append(row)
+
+    report = pd.DataFrame(results)
+    print("\n📊 Encoder backend parity:")
+    print(report.to_string(index=False))
+    report.to_csv(args.output, index=False)
+    print(f"📁 Saved parity report to {args.output}")
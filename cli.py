@@ -0,0 +1,40 @@
+import sys
+import argparse
+import importlib
+
+# Subcommand -> (module, summary). A module is only imported once its subcommand is
+# chosen, so listing commands or running one never pays for another's dependencies.
+COMMANDS = {
+    "export": ("splitwise_export", "Sync expenses from Splitwise."),
+    "anonymize": ("anonymize_users", "Replace friend names with stable fake names."),
+    "build-categories": ("build_categories", "Write the built-in category examples."),
+    "generate-test-set": ("generate_test_set", "Sample expense descriptions for manual labeling."),
+    "categorize": ("categorize_expenses_vector_db", "Categorize expenses against category examples with FAISS."),
+    "categorize-chromadb": ("splitwise_categorizer_with_chromadb", "Categorize with keyword rules and ChromaDB."),
+    "evaluate": ("evaluate_categorization", "Evaluate centroid categorization on the labeled test set."),
+    "evaluate-chromadb": ("evaluate_with_chromadb", "Same evaluation, reported under evaluate_chromadb."),
+    "sweep": ("evaluation_harness", "Cross-validate and sweep classifier configurations on cached embeddings."),
+    "review": ("review_queue", "Rank uncertain expenses for review and feed corrections back."),
+    "serve": ("categorization_service", "Serve warm categorization over HTTP."),
+    "analytics": ("expense_analytics", "Maintain and query spend rollups."),
+    "pipeline": ("pipeline", "Run the stage DAG, skipping unchanged stages."),
+    "metrics": ("metrics", "Compare the latest run report of a script with the previous one."),
+    "convert": ("storage", "Convert datasets between CSV and Parquet."),
+}
+
+
+def main(argv=None):
+    listing = "\n".join(f"  {name:<22}{summary}" for name, (_, summary) in COMMANDS.items())
+    parser = argparse.ArgumentParser(description="Splitwise expense pipeline.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=f"commands:\n{listing}\n\nRun '%(prog)s <command> --help' for its options.")
+    parser.add_argument("command", choices=COMMANDS, metavar="command", help="One of the commands below.")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    module = importlib.import_module(COMMANDS[args.command][0])
+    return module.main(args.args, prog=f"{parser.prog} {args.command}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import re
+import numpy as np
+
+MONTH = r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+DAY = r"\d{1,2}(?:st|nd|rd|th)?"
+# "1st july", "july 1-31", "april 1-may 8", "nov dec", "7/1/25", "2024", "3rd", "(137.15$)"
+DATE_TOKENS = re.compile(
+    rf"\b(?:{DAY}\s*)?{MONTH}\b(?:\s*{DAY}(?:\s*-\s*{DAY})?\b)?"
+    r"|\(?\$?\d+\.\d{2}\$?\)?"
+    r"|\b\d{1,2}(?:st|nd|rd|th)\b"
+    r"|\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b"
+    r"|\b(?:19|20)\d{2}\b"
+)
+LEFTOVER_SEPARATORS = re.compile(r"(?:\s*[-:/,]\s*)+(?=\s|$)|^\s*[-:/,]+")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_descriptions(descriptions):
+    """Lowercase, drop date/month tokens and collapse whitespace; texts that would become empty keep their lowered form."""
+    import pandas as pd
+
+    lowered = pd.Series(descriptions).fillna("").astype(str).str.lower()
+    normalized = (lowered.str.replace(DATE_TOKENS, " ", regex=True)
+                         .str.replace(LEFTOVER_SEPARATORS, " ", regex=True)
+                         .str.replace(WHITESPACE, " ", regex=True)
+                         .str.strip())
+    empty = normalized == ""
+    normalized[empty] = lowered[empty].str.strip()
+    return normalized
+
+
+class DescriptionDictionary:
+    """
+    Unique-text dictionary over a description column.
+
+    `uniques` holds each distinct (optionally normalized) text once and `codes`
+    maps every row to its entry, so expensive per-text work runs on `uniques`
+    and broadcast() spreads the results back to rows. It doubles as the
+    interned string table for a description column: each text is held once
+    and a row costs one int32 code.
+    """
+
+    def __init__(self, descriptions, normalize=True):
+        import pandas as pd
+
+        raw_codes, raw_uniques = pd.factorize(pd.Series(descriptions).fillna("").astype(str))
+        self.n_rows = len(raw_codes)
+        self.n_raw_unique = len(raw_uniques)
+        # Normalizing the raw uniques is enough; rows reuse them through raw_codes
+        texts = normalize_descriptions(raw_uniques) if normalize else pd.Series(raw_uniques)
+        unique_codes, uniques = pd.factorize(texts)
+        self.codes = unique_codes[raw_codes].astype(np.int32)
+        self.uniques = list(uniques)
+
+    def __len__(self):
+        return len(self.uniques)
+
+    def broadcast(self, values):
+        """Map per-unique values (array-like of len(self)) back to one value per row."""
+        return np.asarray(values)[self.codes]
+
+    def broadcast_categorical(self, values):
+        """Like broadcast() for repetitive labels, as a Categorical: a small code per row instead of an object."""
+        import pandas as pd
+
+        codes, labels = pd.factorize(pd.Series(values, dtype=object))
+        return pd.Categorical.from_codes(codes[self.codes], categories=labels)
+
+    def stats(self):
+        return {
+            "rows": self.n_rows,
+            "unique_raw": self.n_raw_unique,
+            "unique_normalized": len(self.uniques),
+            "dedup_ratio": round(self.n_rows / max(len(self.uniques), 1), 2),
+        }
@@ -0,0 +1,306 @@
+import os
+import json
+import atexit
+import hashlib
+import time
+from contextlib import contextmanager
+import numpy as np
+import metrics
+from encoders import DEFAULT_BACKEND, DEFAULT_BATCH_SIZE, load_model, model_key
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+CACHE_DIR = "data/embedding_cache"
+MAX_ENTRIES = 500_000
+# Share of entries that must have been hit before a save with nothing new still rewrites index.json for their ticks
+RECENCY_SAVE_FRACTION = 0.1
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def text_key(model_name, normalize, text):
+    return hashlib.sha1(f"{model_name}\0{int(bool(normalize))}\0{text}".encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock on `path` for the with-block, shared by every process that opens the same file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding store for one model, safe to share between processes.
+
+    Vectors live in a memory-mapped float32 matrix (vectors.f32) and index.json maps
+    each content key to its row plus a last-used tick. When the cache is full the
+    least recently used rows are evicted and their slots reused.
+
+    Several pipeline stages may use the cache at once, so every read of the index
+    and every write happens under index.lock: lookups first pick up an index
+    another process replaced, and new vectors wait in memory (`pending`) until
+    save() merges them into the latest on-disk index, allocates their rows and
+    writes both files. Hits only mark their keys as recently used; a run that
+    adds nothing rewrites the index for them once they cover
+    RECENCY_SAVE_FRACTION of the entries, so warm re-runs stay read-only.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES):
+        self.model_name = model_name
+        self.dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+        self.index_path = os.path.join(self.dir, "index.json")
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self.lock_path = os.path.join(self.dir, "index.lock")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dirty = False
+
+        self.dim = None
+        self.capacity = 0
+        self.clock = 0
+        self.entries = {}
+        self.free_rows = []
+        self.vectors = None
+        self.index_stamp = None
+        # New vectors not yet in the shared files, and keys hit since the last save
+        self.pending = {}
+        self.touched = set()
+        if os.path.exists(self.index_path):
+            with file_lock(self.lock_path):
+                self.refresh()
+
+    def __len__(self):
+        return len(self.entries) + sum(key not in self.entries for key in self.pending)
+
+    def refresh(self):
+        """Re-read index.json if another process replaced it since we last did; call with the lock held."""
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            return
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp == self.index_stamp:
+            return
+        with open(self.index_path, "r") as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.clock = max(self.clock, meta["clock"])
+        self.entries = {k: list(v) for k, v in meta["entries"].items()}
+        used = {row for row, _ in self.entries.values()}
+        self.free_rows = sorted(set(range(meta["capacity"])) - used, reverse=True)
+        if self.vectors is None or meta["capacity"] != self.capacity:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+",
+                                     shape=(meta["capacity"], self.dim))
+        self.capacity = meta["capacity"]
+        self.index_stamp = stamp
+
+    def get(self, keys):
+        """Return (vectors for the keys that were found, positions of those keys, positions that missed)."""
+        found, found_pos, missing_pos = [], [], []
+        with file_lock(self.lock_path):
+            self.refresh()
+            rows = []
+            for pos, key in enumerate(keys):
+                entry = self.entries.get(key)
+                if entry is not None:
+                    rows.append(entry[0])
+                    found_pos.append(pos)
+                    self.touched.add(key)
+                elif key in self.pending:
+                    rows.append(None)
+                    found_pos.append(pos)
+                else:
+                    missing_pos.append(pos)
+            # Rows are only stable while the lock is held: another process may evict and reuse them
+            disk = [row for row in rows if row is not None]
+            disk_vectors = iter(np.asarray(self.vectors[disk]) if disk else [])
+            found = [next(disk_vectors) if row is not None else self.pending[keys[pos]]
+                     for row, pos in zip(rows, found_pos)]
+        self.hits += len(found_pos)
+        self.misses += len(missing_pos)
+        if found_pos:
+            return np.stack(found), found_pos, missing_pos
+        return None, found_pos, missing_pos
+
+    def put(self, keys, vectors):
+        """Hold new vectors in memory; save() writes them to the shared files."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        for key, vector in zip(list(keys)[:self.max_entries], vectors[:self.max_entries]):
+            self.pending[key] = vector
+        self.dirty = True
+
+    def evict(self, n):
+        oldest = sorted(self.entries.items(), key=lambda kv: kv[1][1])[:n]
+        for key, (row, _) in oldest:
+            del self.entries[key]
+            self.free_rows.append(row)
+        self.evictions += len(oldest)
+
+    def grow(self, needed):
+        new_capacity = min(max(needed, self.capacity * 2, 1024), self.max_entries)
+        os.makedirs(self.dir, exist_ok=True)
+        if self.vectors is not None:
+            self.vectors.flush()
+            del self.vectors
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+",
+                                 shape=(new_capacity, self.dim))
+        self.free_rows = list(range(new_capacity - 1, self.capacity - 1, -1)) + self.free_rows
+        self.capacity = new_capacity
+
+    def save(self):
+        """Merge pending vectors and last-used ticks into the on-disk cache under the lock."""
+        if self.dim is None:
+            return
+        if not self.dirty and len(self.touched) < RECENCY_SAVE_FRACTION * max(len(self.entries), 1):
+            return
+        with file_lock(self.lock_path):
+            self.refresh()
+            self.clock += 1
+            for key in self.touched:
+                if key in self.entries:
+                    self.entries[key][1] = self.clock
+            new_keys = [key for key in self.pending if key not in self.entries][-self.max_entries:]
+            overflow = len(self.entries) + len(new_keys) - self.max_entries
+            if overflow > 0:
+                self.evict(overflow)
+            if len(self.free_rows) < len(new_keys):
+                self.grow(len(self.entries) + len(new_keys))
+            if new_keys:
+                rows = [self.free_rows.pop() for _ in new_keys]
+                self.vectors[rows] = np.stack([self.pending[key] for key in new_keys])
+                for key, row in zip(new_keys, rows):
+                    self.entries[key] = [row, self.clock]
+            if self.vectors is not None:
+                self.vectors.flush()
+            # A per-process temp name, so concurrent savers never rename each other's half-written file
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "model_name": self.model_name,
+                    "dim": self.dim,
+                    "capacity": self.capacity,
+                    "clock": self.clock,
+                    "entries": self.entries,
+                }, f)
+            os.replace(tmp_path, self.index_path)
+            st = os.stat(self.index_path)
+            self.index_stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        self.pending.clear()
+        self.touched.clear()
+        self.dirty = False
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class CachedEncoder:
+    """
+    Drop-in stand-in for SentenceTransformer.encode backed by EmbeddingCache.
+
+    The model itself is only loaded the first time a text misses the cache, so a
+    re-run over unchanged data never touches the model. With autosave=False new
+    entries are only written by save() or at exit, which long-running callers
+    use to keep index writes off the request path. Each backend gets its own
+    cache (see encoders.model_key) since quantized vectors differ slightly.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES, autosave=True,
+                 backend=DEFAULT_BACKEND, threads=None, batch_size=DEFAULT_BATCH_SIZE, model=None):
+        self.model_name = model_name
+        self.backend = backend
+        self.threads = threads
+        self.batch_size = batch_size
+        self.model_key = model_key(model_name, backend)
+        self.cache = EmbeddingCache(self.model_key, cache_dir, max_entries)
+        self.autosave = autosave
+        self.forward_passes = 0
+        # Anything with SentenceTransformer's encode() signature, e.g. a parallel_encoder.ShardedEncoder
+        self._model = model
+        # Hits only bump last-used ticks; persist them once at exit instead of per call
+        atexit.register(self.cache.save)
+
+    @property
+    def model(self):
+        if self._model is None:
+            with metrics.step("model_load"):
+                self._model = load_model(self.model_name, self.backend, self.threads)
+        return self._model
+
+    def encode(self, texts, normalize_embeddings=False, convert_to_tensor=False,
+               batch_size=None, show_progress_bar=False):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+
+        # Identical texts within one call are looked up and encoded once
+        unique_texts = list(dict.fromkeys(texts))
+        keys = [text_key(self.model_key, normalize_embeddings, t) for t in unique_texts]
+        found, found_pos, missing_pos = self.cache.get(keys)
+
+        unique_vectors = None
+        if found is not None:
+            unique_vectors = np.empty((len(unique_texts), found.shape[1]), dtype=np.float32)
+            unique_vectors[found_pos] = found
+        if missing_pos:
+            model = self.model
+            start = time.perf_counter()
+            encoded = model.encode([unique_texts[i] for i in missing_pos], batch_size=batch_size or self.batch_size,
+                                   normalize_embeddings=normalize_embeddings, show_progress_bar=show_progress_bar)
+            encoded = np.asarray(encoded, dtype=np.float32)
+            metrics.observe("encode_batch_seconds", time.perf_counter() - start)
+            metrics.count("texts_encoded", len(missing_pos))
+            self.forward_passes += 1
+            if unique_vectors is None:
+                unique_vectors = np.empty((len(unique_texts), encoded.shape[1]), dtype=np.float32)
+            unique_vectors[missing_pos] = encoded
+            self.cache.put([keys[i] for i in missing_pos], encoded)
+            if self.autosave:
+                self.cache.save()
+
+        if unique_vectors is None:
+            unique_vectors = np.empty((0, self.cache.dim or 0), dtype=np.float32)
+        position = {t: i for i, t in enumerate(unique_texts)}
+        vectors = unique_vectors[[position[t] for t in texts]] if texts else unique_vectors
+
+        if single:
+            vectors = vectors[0]
+        if convert_to_tensor:
+            import torch
+            return torch.from_numpy(np.ascontiguousarray(vectors))
+        return vectors
+
+    def report(self):
+        stats = self.cache.stats()
+        metrics.record_cache("embedding", stats)
+        print(f"🗄️ Embedding cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['entries']} entries ({stats['hit_rate']*100:.1f}% hit rate)")
+        return stats
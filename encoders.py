@@ -0,0 +1,54 @@
+import os
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+DEFAULT_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+# Pre-quantized export shipped in the sentence-transformers model repos; AVX2 runs on any recent x86 CPU
+ONNX_INT8_FILE = os.environ.get("EMBEDDING_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+DEFAULT_BATCH_SIZE = 64
+
+
+def model_key(model_name, backend):
+    """Name used for caches and indexes, so vectors from different backends are never mixed."""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def load_model(model_name=MODEL_NAME, backend=DEFAULT_BACKEND, threads=None):
+    """
+    Load a SentenceTransformer on CPU with the requested inference backend.
+
+    torch:      default fp32 PyTorch
+    torch-int8: PyTorch with Linear layers dynamically quantized to int8
+    onnx:       ONNX Runtime export of the same model
+    onnx-int8:  ONNX Runtime with the pre-quantized int8 export
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+    from sentence_transformers import SentenceTransformer
+
+    if backend.startswith("onnx"):
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        if threads:
+            import onnxruntime
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = threads
+            model_kwargs["session_options"] = session_options
+        if backend == "onnx-int8":
+            model_kwargs["file_name"] = ONNX_INT8_FILE
+        return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+    model = SentenceTransformer(model_name, device="cpu")
+    if backend == "torch-int8":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def add_encoder_args(parser):
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="Embedding inference backend (default: $EMBEDDING_BACKEND or torch).")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads for the backend.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Encode batch size.")
+    return parser
@@ -1,74 +1,38 @@
-import pandas as pd
-from sentence_transformers import SentenceTransformer, util
-
-# 🔹 Step 1: Load test set and category examples
-print("📥 Loading data...")
-df_test = pd.read_csv("data/test_labels.csv")
-df_examples = pd.read_csv("data/category_examples.csv")
-
-# 🔹 Step 2: Load sentence embedding model
-print("🧠 Loading embedding model...")
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
-# 🔹 Step 3: Compute embeddings
-category_labels = df_examples["category"].unique().tolist()
-category_to_examples = {cat: df_examples[df_examples["category"] == cat]["example"].tolist() for cat in category_labels}
-
-# Compute average embedding for each category
-category_embeddings = {}
-for category, examples in category_to_examples.items():
-    embeddings = model.encode(examples, convert_to_tensor=True)
-    avg_embedding = embeddings.mean(dim=0)
-    category_embeddings[category] = avg_embedding
-
-# 🔹 Step 4: Embed test descriptions and predict
-desc_embeddings = model.encode(df_test["description"].tolist(), convert_to_tensor=True)
-
-predicted = []
-similarities = []
-
-print("🔍 Classifying descriptions...")
-for i, desc_emb in enumerate(desc_embeddings):
-    max_sim = -1
-    best_category = None
-    for category, emb in category_embeddings.items():
-        sim = util.pytorch_cos_sim(desc_emb, emb).item()
-        if sim > max_sim:
-            max_sim = sim
-            best_category = category
-    predicted.append(best_category)
-    similarities.append(max_sim)
-
-df_test["predicted_category"] = predicted
-df_test["similarity_score"] = similarities
-
-# 🔹 Step 5: Confidence scoring
-def confidence_bucket(score):
-    if score >= 0.75:
-        return "High"
-    elif score >= 0.45:
-        return "Medium"
-    else:
-        return "Low"
-
-df_test["confidence_bucket"] = df_test["similarity_score"].apply(confidence_bucket)
-
-# 🔹 Step 6: Evaluation
-df_test["correct"] = df_test["true_category"].str.lower().str.strip() == df_test["predicted_category"].str.lower().str.strip()
-
-accuracy = df_test["correct"].mean()
-low_conf_count = (df_test["confidence_bucket"] == "Low").sum()
-incorrect_count = (~df_test["correct"]).sum()
-
-print(f"\n✅ Model Accuracy: {accuracy*100:.2f}%")
-print(f"⚠️  Low Confidence Predictions (< 0.45): {low_conf_count}")
-print(f"❌ Incorrect Predictions: {incorrect_count}\n")
-
-# 🔹 Step 7: Category-level metrics
-print("📊 Per-Category Accuracy:")
-print(df_test.groupby("true_category")["correct"].agg(["count", "sum", "mean"]).rename(columns={"sum": "correct", "mean": "accuracy"}).round(2))
-
-# 🔹 Step 8: Save errors and low-confidence cases
-errors_df = df_test[(~df_test["correct"]) | (df_test["confidence_bucket"] == "Low")]
-errors_df.to_csv("data/eval_errors.csv", index=False)
-print("\n📁 Mismatches/Low confidence saved to: data/eval_errors.csv")
+import argparse
+import storage
+import metrics
+from embedding_cache import CachedEncoder
+from encoders import add_encoder_args
+from centroid_classifier import evaluate_centroids, print_evaluation_report
+
+
+def main(argv=None, prog=None, report_name="evaluate"):
+    """Centroid evaluation on the labeled test set; `report_name` names its run report."""
+    parser = argparse.ArgumentParser(prog=prog, description="Evaluate centroid categorization on the labeled test set.")
+    args = add_encoder_args(parser).parse_args(argv)
+    metrics.start_run(report_name)
+    metrics.set_info(backend=args.backend)
+    import pandas as pd
+
+    # 🔹 Step 1: Load test set and category examples
+    print("📥 Loading data...")
+    with metrics.step("load_data"):
+        df_test = pd.read_csv(storage.TEST_LABELS_PATH)
+        df_examples = pd.read_csv(storage.CATEGORY_EXAMPLES_PATH)
+
+    # 🔹 Step 2: Load sentence embedding model
+    print("🧠 Loading embedding model...")
+    model = CachedEncoder("all-MiniLM-L6-v2", backend=args.backend, threads=args.threads, batch_size=args.batch_size)
+
+    # 🔹 Step 3-5: Embed category centroids and test descriptions, predict and bucket confidence
+    print("🔍 Classifying descriptions...")
+    with metrics.step("classify", rows=len(df_test)):
+        df_test = evaluate_centroids(model, df_test, df_examples)
+
+    # 🔹 Step 6-8: Accuracy, per-category metrics, save errors and low-confidence cases
+    print_evaluation_report(df_test, "data/eval_errors.csv")
+    model.report()
+
+
+if __name__ == "__main__":
+    main()
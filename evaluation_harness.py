@@ -0,0 +1,226 @@
+import os
+import time
+import argparse
+from itertools import product
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import storage
+import metrics
+from encoders import MODEL_NAME, add_encoder_args
+from centroid_classifier import CentroidClassifier, LOW_CONFIDENCE_THRESHOLD, normalize_rows
+from example_index import VOTING, vote
+from keyword_rules import RULES_PATH
+
+REPORT_DIR = os.path.join(storage.DATA_DIR, "eval_harness")
+NEEDS_REVIEW = "needs review"
+DEFAULT_THRESHOLDS = "0.3,0.35,0.4,0.45,0.5,0.55,0.6,0.65,0.7"
+DEFAULT_KS = "1,3,5,10"
+
+
+def normalize_labels(labels):
+    """Categories compared the way evaluate_centroids does: lowercased and stripped."""
+    return np.array([str(label).strip().lower() for label in labels], dtype=object)
+
+
+def make_folds(n, folds, seed=42):
+    """Shuffled index arrays for k-fold cross-validation; folds <= 1 is a single fold over every row."""
+    if folds <= 1:
+        return [np.arange(n)]
+    return np.array_split(np.random.default_rng(seed).permutation(n), folds)
+
+
+def build_configs(methods, ks, votings, with_labeled):
+    """Every combination to evaluate, as dicts; kNN with k > 1 is crossed with each voting rule."""
+    configs = []
+    references = ["examples", "examples+labeled"] if with_labeled else ["examples"]
+    for method, rules, reference in product(methods, (False, True), references):
+        if method == "centroid":
+            variants = [(None, None)]
+        else:
+            variants = [(k, voting) for k in ks for voting in (votings if k > 1 else [None])]
+        for k, voting in variants:
+            name = method if k is None else f"knn k={k}" + (f" {voting}" if voting else "")
+            name += (" +rules" if rules else "") + (" +labeled" if reference != "examples" else "")
+            configs.append({"config": name, "method": method, "k": k, "voting": voting, "rules": rules,
+                            "references": reference})
+    return configs
+
+
+def predict(config, ref_vectors, ref_labels, query_vectors):
+    """Top category and its similarity for each query, from vectors only."""
+    if config["method"] == "centroid":
+        labels = np.unique(ref_labels)
+        centroids = np.stack([ref_vectors[ref_labels == label].mean(axis=0) for label in labels])
+        result = CentroidClassifier(labels, centroids).classify(query_vectors)
+        return result["predicted"], result["score"]
+
+    k = min(config["k"], len(ref_vectors))
+    similarities = query_vectors @ ref_vectors.T
+    top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(similarities, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    categories = ref_labels[top]
+    if k == 1:
+        return categories[:, 0], top_scores[:, 0]
+    scores, predicted, _ = vote(top_scores, categories, categories, config["voting"])
+    return predicted, scores
+
+
+def run_config(config, data, folds):
+    """Cross-validated predictions for one configuration; rows come back in their original order."""
+    n = len(data["labels"])
+    predicted = np.empty(n, dtype=object)
+    scores = np.zeros(n, dtype=np.float32)
+    seconds = 0.0
+    for test_idx in folds:
+        ref_vectors, ref_labels = data["example_vectors"], data["example_labels"]
+        if config["references"] == "examples+labeled":
+            train_idx = np.setdiff1d(np.arange(n), test_idx)
+            ref_vectors = np.vstack([ref_vectors, data["vectors"][train_idx]])
+            ref_labels = np.concatenate([ref_labels, data["labels"][train_idx]])
+        start = time.perf_counter()
+        fold_predicted, fold_scores = predict(config, ref_vectors, ref_labels, data["vectors"][test_idx])
+        seconds += time.perf_counter() - start
+        predicted[test_idx] = fold_predicted
+        scores[test_idx] = fold_scores
+
+    if config["rules"]:
+        hit = data["rule_labels"] != None  # noqa: E711 - elementwise on an object array
+        predicted = np.where(hit, data["rule_labels"], predicted)
+        scores = np.where(hit, 1.0, scores)
+        seconds += data["rule_seconds"]
+    return predicted, scores, seconds / n * 1000
+
+
+def score_predictions(config, predicted, scores, labels, folds, threshold, ms_per_query):
+    """Summary row plus per-category rows for one configuration at one abstention threshold."""
+    predicted = np.where(scores < threshold, NEEDS_REVIEW, predicted)
+    correct = predicted == labels
+    covered = predicted != NEEDS_REVIEW
+    categories = np.unique(labels)
+    per_category = []
+    for category in categories:
+        support = int((labels == category).sum())
+        claimed = int((predicted == category).sum())
+        hits = int((correct & (labels == category)).sum())
+        per_category.append({"config": config["config"], "category": category, "support": support,
+                             "predicted": claimed, "precision": hits / claimed if claimed else 0.0,
+                             "recall": hits / support})
+    fold_accuracy = [correct[idx].mean() for idx in folds]
+    summary = {
+        "config": config["config"], "threshold": threshold,
+        "accuracy": round(float(correct.mean()), 4),
+        "accuracy_std": round(float(np.std(fold_accuracy)), 4),
+        "coverage": round(float(covered.mean()), 4),
+        "covered_accuracy": round(float(correct[covered].mean()), 4) if covered.any() else 0.0,
+        "macro_precision": round(float(np.mean([c["precision"] for c in per_category])), 4),
+        "macro_recall": round(float(np.mean([c["recall"] for c in per_category])), 4),
+        "ms_per_query": round(ms_per_query, 4),
+    }
+    summary.update({key: config[key] for key in ("method", "k", "voting", "rules", "references")})
+    return summary, per_category
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Sweep classifier configurations over cached "
+                                     "embeddings with k-fold cross-validation.")
+    parser.add_argument("--labels", default=storage.TEST_LABELS_PATH, help="CSV with description,true_category.")
+    parser.add_argument("--examples", default=storage.CATEGORY_EXAMPLES_PATH)
+    parser.add_argument("--rules", default=RULES_PATH, help="Keyword rules for the +rules configurations.")
+    parser.add_argument("--folds", type=int, default=5, help="Cross-validation folds (1 = no labeled references).")
+    parser.add_argument("--methods", default="centroid,knn")
+    parser.add_argument("--ks", default=DEFAULT_KS, help="Neighbour counts for kNN.")
+    parser.add_argument("--votings", default=",".join(VOTING), help="Voting rules for kNN with k > 1.")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS,
+                        help="Low-confidence thresholds below which a prediction becomes Needs Review.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Configurations evaluated in parallel.")
+    parser.add_argument("--top", type=int, default=10, help="Configurations shown in the printed ranking.")
+    parser.add_argument("--output-dir", default=REPORT_DIR)
+    add_encoder_args(parser)
+    args = parser.parse_args(argv)
+    metrics.start_run("eval_harness")
+    metrics.set_info(backend=args.backend, folds=args.folds)
+
+    import pandas as pd
+    from embedding_cache import CachedEncoder
+    from keyword_rules import load_keyword_rules
+    from splitwise_categorizer_with_chromadb import category_examples
+
+    start = time.perf_counter()
+    # 🔹 Step 1: Load labeled descriptions and category examples
+    df_labels = pd.read_csv(args.labels).dropna(subset=["description", "true_category"])
+    df_labels = df_labels[df_labels["true_category"].astype(str).str.strip() != ""]
+    df_examples = pd.read_csv(args.examples).dropna(subset=["category", "example"])
+    descriptions = df_labels["description"].astype(str).tolist()
+    examples = df_examples["example"].astype(str).tolist()
+
+    # 🔹 Step 2: Embed every text once; all configurations reuse these vectors
+    print(f"🧠 Embedding {len(descriptions)} labeled descriptions and {len(examples)} examples once...")
+    model = CachedEncoder(MODEL_NAME, backend=args.backend, threads=args.threads, batch_size=args.batch_size)
+    with metrics.step("encode", rows=len(descriptions) + len(examples)):
+        vectors = normalize_rows(model.encode(descriptions + examples))
+
+    rules = load_keyword_rules(category_examples, args.rules)
+    rule_start = time.perf_counter()
+    rule_labels = rules.apply(descriptions).to_numpy(dtype=object)
+    rule_seconds = time.perf_counter() - rule_start
+    data = {
+        "vectors": vectors[:len(descriptions)],
+        "labels": normalize_labels(df_labels["true_category"]),
+        "example_vectors": vectors[len(descriptions):],
+        "example_labels": normalize_labels(df_examples["category"]),
+        "rule_labels": np.array([None if r is None else str(r).strip().lower() for r in rule_labels], dtype=object),
+        "rule_seconds": rule_seconds,
+    }
+
+    # 🔹 Step 3: Run every configuration across the folds in parallel
+    folds = make_folds(len(descriptions), args.folds)
+    configs = build_configs(args.methods.split(","), [int(k) for k in args.ks.split(",")], args.votings.split(","),
+                            with_labeled=args.folds > 1)
+    thresholds = sorted({float(t) for t in args.thresholds.split(",")} | {LOW_CONFIDENCE_THRESHOLD})
+    print(f"🧪 {len(configs)} configurations x {len(thresholds)} thresholds, {len(folds)} fold(s), "
+          f"{args.jobs} parallel jobs...")
+    with metrics.step("sweep", rows=len(configs) * len(descriptions)):
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            runs = list(pool.map(lambda config: run_config(config, data, folds), configs))
+
+    summaries, per_category = [], []
+    for config, (predicted, scores, ms_per_query) in zip(configs, runs):
+        for threshold in thresholds:
+            summary, categories = score_predictions(config, predicted, scores, data["labels"], folds, threshold,
+                                                    ms_per_query)
+            summaries.append(summary)
+            if threshold == LOW_CONFIDENCE_THRESHOLD:
+                per_category += categories
+    report = pd.DataFrame(summaries)
+    categories = pd.DataFrame(per_category).round(4)
+
+    # 🔹 Step 4: Comparative report
+    at_default = report[report["threshold"] == LOW_CONFIDENCE_THRESHOLD].sort_values(
+        ["accuracy", "ms_per_query"], ascending=[False, True])
+    columns = ["config", "accuracy", "accuracy_std", "coverage", "covered_accuracy", "macro_precision",
+               "macro_recall", "ms_per_query"]
+    print(f"\n📊 Top configurations at threshold {LOW_CONFIDENCE_THRESHOLD}:")
+    print(at_default[columns].head(args.top).to_string(index=False))
+    best = at_default.iloc[0]["config"]
+    print(f"\n🎚️ Threshold sweep for {best}:")
+    print(report[report["config"] == best][["threshold", "accuracy", "coverage", "covered_accuracy"]]
+          .to_string(index=False))
+    print(f"\n📋 Per-category precision/recall for {best}:")
+    print(categories[categories["config"] == best].drop(columns="config").to_string(index=False))
+    metrics.set_info(best_config=best, best_accuracy=float(at_default.iloc[0]["accuracy"]))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    report.to_csv(os.path.join(args.output_dir, "report.csv"), index=False)
+    categories.to_csv(os.path.join(args.output_dir, "per_category.csv"), index=False)
+    print(f"\n📁 Saved report.csv and per_category.csv to {args.output_dir} "
+          f"({time.perf_counter() - start:.1f}s total)")
+    model.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+INDEX_DIR = "data/example_index"
+INDEX_MODES = ("flat", "fp16", "sq8", "ivf", "hnsw", "ivfpq")
+# Exact-search modes that store vectors as float16 or int8 codes and score queries against them directly
+SCALAR_QUANTIZERS = {"fp16": "SQfp16", "sq8": "SQ8"}
+VOTING = ("majority", "weighted")
+# Columns the categorizer writes; a table carrying them holds model predictions, not human labels
+PREDICTION_COLUMNS = ("matched_example", "similarity_score", "low_confidence_flag")
+HNSW_M = 32
+PQ_SUBQUANTIZERS = 48
+# IVF indexes are retrained once the corpus outgrows the one they were trained on by this factor
+RETRAIN_GROWTH = 4
+
+
+def example_id(category, example):
+    """Stable positive int64 id derived from the (category, example) content."""
+    return int(hashlib.sha1(f"{category}\0{example}".encode("utf-8")).hexdigest()[:15], 16)
+
+
+def default_nlist(n):
+    """IVF list count: ~4*sqrt(n), with at least ~39 training points per list."""
+    return int(max(1, min(4 * np.sqrt(n), n // 39)))
+
+
+def index_factory_string(mode, n, dim, nlist=None, hnsw_m=HNSW_M, pq_m=PQ_SUBQUANTIZERS):
+    if mode == "flat":
+        return "IDMap2,Flat"
+    if mode in SCALAR_QUANTIZERS:
+        return f"IDMap2,{SCALAR_QUANTIZERS[mode]}"
+    if mode == "hnsw":
+        return f"IDMap2,HNSW{hnsw_m}"
+    nlist = nlist or default_nlist(n)
+    if mode == "ivf":
+        return f"IVF{nlist},Flat"
+    if mode == "ivfpq":
+        # 256 codes per subquantizer need ~10k training points; small corpora get 16
+        nbits = 8 if n >= 39 * 256 else 4
+        while dim % pq_m:
+            pq_m -= 1
+        return f"IVF{nlist},PQ{pq_m}x{nbits}"
+    raise ValueError(f"Unknown index mode {mode!r}, expected one of {INDEX_MODES}")
+
+
+def mmap_flags():
+    """Memory-map the flat vector storage where this faiss build supports it."""
+    import faiss
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    import faiss
+
+    space = faiss.ParameterSpace()
+    if nprobe and faiss.try_extract_index_ivf(index) is not None:
+        space.set_index_parameter(index, "nprobe", nprobe)
+    if ef_search and "HNSW" in type(faiss.downcast_index(getattr(index, "index", index))).__name__:
+        space.set_index_parameter(index, "efSearch", ef_search)
+
+
+def vote(scores, categories, examples, voting="majority"):
+    """
+    Collapse (n, k) neighbour results into one (score, category, example) per row.
+
+    majority counts neighbours per category (ties go to the higher summed
+    similarity); weighted sums the similarities. The returned score and example
+    are those of the best neighbour in the winning category.
+    """
+    import pandas as pd
+
+    n, k = scores.shape
+    codes, labels = pd.factorize(pd.Series(categories.ravel()), use_na_sentinel=True)
+    codes = codes.reshape(n, k)
+    valid = codes >= 0
+    weights = np.where(valid, np.maximum(scores, 0), 0.0)
+    if voting == "majority":
+        weights = valid + weights * 1e-3
+    elif voting != "weighted":
+        raise ValueError(f"Unknown voting {voting!r}, expected one of {VOTING}")
+
+    totals = np.zeros((n, max(len(labels), 1)))
+    rows = np.repeat(np.arange(n), k).reshape(n, k)
+    np.add.at(totals, (rows[valid], codes[valid]), weights[valid])
+    winner = totals.argmax(axis=1)
+
+    # Neighbours come back sorted by similarity, so the first one in the winning category is its best
+    best = np.argmax(codes == winner[:, None], axis=1)
+    pick = (np.arange(n), best)
+    return scores[pick], categories[pick], examples[pick]
+
+
+def load_reference_set(examples_path, history=None, history_column=None, reviewed=None):
+    """
+    Category examples plus, optionally, human-labeled expenses as extra kNN references.
+
+    `history` is a dataset name or path with a description column and a
+    true_category or category column, such as the test labels or the review
+    log. Categorizer output is refused: its labels are the model's own guesses
+    and would only reinforce themselves. History rows join under normalized
+    descriptions, so an expense labeled before matches its own label exactly;
+    holding rows out of their own references is left to evaluation, which
+    does it per fold (see evaluation_harness).
+    `reviewed` is the review queue's corrections log, whose normalized descriptions
+    join as examples so the index picks them up incrementally.
+    """
+    import pandas as pd
+
+    df_examples = pd.read_csv(examples_path)[["category", "example"]]
+    if reviewed:
+        from review_queue import load_review_labels
+        labels = load_review_labels(reviewed)
+        if labels:
+            df_reviewed = pd.DataFrame({"category": list(labels.values()), "example": list(labels)})
+            df_examples = pd.concat([df_examples, df_reviewed], ignore_index=True).drop_duplicates()
+            print(f"✍️ Reference set: +{len(labels)} reviewed corrections")
+    if not history:
+        return df_examples
+    import storage
+    from description_dictionary import normalize_descriptions
+    df_history = storage.read_table(history)
+    predicted = [column for column in PREDICTION_COLUMNS if column in df_history.columns]
+    if predicted:
+        raise ValueError(f"{history} holds categorizer output ({', '.join(predicted)}); history must be "
+                         f"human-labeled, e.g. {storage.TEST_LABELS_PATH} or the review log")
+    history_column = history_column or ("true_category" if "true_category" in df_history.columns else "category")
+    df_history = df_history.dropna(subset=["description", history_column])
+    df_history = pd.DataFrame({"category": df_history[history_column].astype(str).to_numpy(),
+                               "example": normalize_descriptions(df_history["description"]).to_numpy()})
+    reference = pd.concat([df_examples, df_history], ignore_index=True).drop_duplicates(["category", "example"])
+    print(f"📚 Reference set: {len(df_examples)} examples + {len(reference) - len(df_examples)} labeled expenses")
+    return reference
+
+
+class ExampleIndex:
+    """
+    FAISS inner-product index over category examples, persisted with a manifest.
+
+    Vectors are stored under content-hash ids, and manifest.json records the
+    model name, index mode plus id -> (category, example). On load, only
+    examples that were added or changed are encoded and added, and deleted
+    ones are removed by id; an unchanged set is just memory-mapped.
+
+    `mode` picks exact search (flat), exact search over compact vectors
+    (fp16 at half and sq8 at a quarter of the float32 size, with inner products
+    computed on the fly from the codes) or an approximate index for large
+    reference sets: ivf, hnsw or ivfpq. IVF and sq8 indexes are trained on the
+    corpus when built; HNSW cannot delete, so removals rebuild it.
+    """
+
+    def __init__(self, index, examples, mode="flat"):
+        self.index = index
+        self.examples = examples
+        self.mode = mode
+
+    @classmethod
+    def load_or_build(cls, df_examples, encoder, model_name, index_dir=INDEX_DIR, mode="flat", nlist=None,
+                      nprobe=None, ef_search=None):
+        import faiss
+
+        index_path = os.path.join(index_dir, "examples.faiss")
+        manifest_path = os.path.join(index_dir, "manifest.json")
+
+        current = {}
+        for category, example in zip(df_examples["category"], df_examples["example"].fillna("").astype(str)):
+            current[example_id(category, example)] = (category, example)
+
+        manifest = None
+        if os.path.exists(index_path) and os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("model_name") != model_name:
+                print(f"♻️ Example index was built with {manifest.get('model_name')}, rebuilding...")
+                manifest = None
+            elif manifest.get("mode", "flat") != mode or (nlist and manifest.get("nlist") != nlist):
+                print(f"♻️ Example index mode changed to {mode}, rebuilding...")
+                manifest = None
+
+        trained_on = None
+        if manifest is None:
+            added, removed = set(current), set()
+            index = None
+        else:
+            stored = {int(k) for k in manifest["examples"]}
+            added, removed = set(current) - stored, stored - set(current)
+            if not added and not removed:
+                print("⚡ Example index unchanged, memory-mapping it from disk...")
+                index = faiss.read_index(index_path, mmap_flags())
+                set_search_params(index, nprobe, ef_search)
+                return cls(index, current, mode)
+            trained_on = manifest.get("trained_on")
+            if (mode == "hnsw" and removed) or (trained_on and len(current) > RETRAIN_GROWTH * trained_on):
+                print(f"♻️ Rebuilding the {mode} index from scratch...")
+                added, removed = set(current), set()
+                index = None
+            else:
+                index = faiss.read_index(index_path)
+
+        print(f"⚡ Updating example index: +{len(added)} / -{len(removed)} examples...")
+        if removed and index is not None:
+            index.remove_ids(np.array(sorted(removed), dtype=np.int64))
+        if added:
+            ids = sorted(added)
+            vectors = encoder.encode([current[i][1] for i in ids], normalize_embeddings=True)
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            if index is None:
+                factory = index_factory_string(mode, len(vectors), vectors.shape[1], nlist)
+                index = faiss.index_factory(vectors.shape[1], factory, faiss.METRIC_INNER_PRODUCT)
+                if not index.is_trained:
+                    print(f"🏋️ Training {factory} on {len(vectors)} vectors...")
+                    index.train(vectors)
+                    trained_on = len(vectors)
+            index.add_with_ids(vectors, np.array(ids, dtype=np.int64))
+
+        os.makedirs(index_dir, exist_ok=True)
+        faiss.write_index(index, index_path)
+        with open(manifest_path, "w") as f:
+            json.dump({
+                "model_name": model_name,
+                "mode": mode,
+                "nlist": nlist,
+                "trained_on": trained_on if mode in ("ivf", "ivfpq", "sq8") else None,
+                "examples": {str(i): list(v) for i, v in current.items()},
+            }, f, indent=2)
+        set_search_params(index, nprobe, ef_search)
+        return cls(index, current, mode)
+
+    def nbytes(self):
+        """Memory held by the stored vectors, or None for index types that do not report a code size."""
+        try:
+            return self.index.ntotal * self.index.sa_code_size()
+        except RuntimeError:
+            return None
+
+    def search(self, vectors, k=1):
+        """Return (scores, categories, examples) arrays of shape (n, k)."""
+        scores, ids = self.index.search(np.ascontiguousarray(vectors, dtype=np.float32), k)
+        categories = np.array([[self.examples[i][0] if i >= 0 else None for i in row] for row in ids], dtype=object)
+        examples = np.array([[self.examples[i][1] if i >= 0 else None for i in row] for row in ids], dtype=object)
+        return scores, categories, examples
+
+    def classify(self, vectors, k=1, voting="majority"):
+        """Return 1-D (scores, categories, examples): the nearest example for k=1, else a vote over k neighbours."""
+        scores, categories, examples = self.search(vectors, k=min(k, max(len(self.examples), 1)))
+        if scores.shape[1] == 1:
+            return scores[:, 0], categories[:, 0], examples[:, 0]
+        return vote(scores, categories, examples, voting)
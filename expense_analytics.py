@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import argparse
+from itertools import combinations
+
+import numpy as np
+
+import storage
+import metrics
+
+ANALYTICS_DIR = os.path.join(storage.DATA_DIR, "analytics")
+ROLLUP_PATH = os.path.join(ANALYTICS_DIR, "rollup.csv")
+ROLLUP_STATE_PATH = os.path.join(ANALYTICS_DIR, "rollup_state.json")
+FX_RATES_PATH = os.path.join(storage.DATA_DIR, "fx_rates.csv")
+BASE_CURRENCY = "USD"
+DIMENSIONS = ("month", "category", "paid_by", "currency")
+# Group-bys with at most this many possible keys use a dense lookup table instead of a sort
+DENSE_GROUP_LIMIT = 1 << 22
+SOURCE_COLUMNS = ["date", "amount", "currency", "paid_by", "description", "category"]
+
+
+# -----------------------------
+# 🧱 Building the rollup
+# -----------------------------
+def month_signatures(df):
+    """Per-month (row count, content hash), used to find the months whose rows changed."""
+    import pandas as pd
+
+    row_hashes = pd.util.hash_pandas_object(df[SOURCE_COLUMNS], index=False)
+    grouped = pd.DataFrame({"month": df["month"], "hash": row_hashes.to_numpy()}).groupby("month")["hash"]
+    # Order-independent sum of row hashes (wrapping uint64 arithmetic)
+    return {month: [int(count), str(int(total))]
+            for month, count, total in zip(grouped.size().index, grouped.size().to_numpy(), grouped.sum().to_numpy())}
+
+
+def rollup_frame(df):
+    """Spend, row count by month x category x payer x currency, in each row's own currency."""
+    rollup = (df.groupby(list(DIMENSIONS), observed=True, dropna=False)
+                .agg(rows=("amount", "size"), amount=("amount", "sum"))
+                .reset_index())
+    rollup["amount"] = rollup["amount"].round(2)
+    return rollup
+
+
+def load_source(input_name):
+    df = storage.read_table(input_name, columns=SOURCE_COLUMNS)
+    df["month"] = df["date"].dt.strftime("%Y-%m").fillna("unknown")
+    for col in ("category", "paid_by", "currency"):
+        if df[col].hasnans:
+            # Categorical columns only take fill values that are already categories
+            df[col] = df[col].astype("string").fillna("Unknown").astype("category")
+    return df
+
+
+def update_rollup(input_name="expenses_categorized", rollup_path=ROLLUP_PATH, state_path=ROLLUP_STATE_PATH,
+                  full=False):
+    """
+    Bring the rollup table in line with the categorized expenses.
+
+    Only months whose rows changed since the last update (new, edited or
+    deleted expenses) are re-aggregated; every other month's rollup rows are
+    kept as they are. Returns the list of months that were rebuilt.
+    """
+    import pandas as pd
+
+    with metrics.step("read") as entry:
+        df = load_source(input_name)
+        entry["rows"] = len(df)
+
+    state = {}
+    if not full and os.path.exists(state_path) and os.path.exists(rollup_path):
+        with open(state_path, "r") as f:
+            state = json.load(f)
+        if state.get("input") != input_name:
+            state = {}
+
+    with metrics.step("signatures", rows=len(df)):
+        signatures = month_signatures(df)
+    previous = state.get("months", {})
+    changed = sorted(m for m, sig in signatures.items() if previous.get(m) != sig)
+    removed = sorted(set(previous) - set(signatures))
+    if not changed and not removed:
+        print("✅ Rollup is up to date.")
+        return []
+
+    with metrics.step("aggregate") as entry:
+        rebuilt = df[df["month"].isin(changed)]
+        entry["rows"] = len(rebuilt)
+        fresh = rollup_frame(rebuilt)
+        if state:
+            kept = pd.read_csv(rollup_path, keep_default_na=False)
+            kept = kept[~kept["month"].isin(set(changed) | set(removed))]
+            fresh = pd.concat([kept, fresh], ignore_index=True)
+        fresh = fresh.sort_values(list(DIMENSIONS)).reset_index(drop=True)
+
+    with metrics.step("write", rows=len(fresh)):
+        os.makedirs(os.path.dirname(rollup_path) or ".", exist_ok=True)
+        fresh.to_csv(rollup_path + ".tmp", index=False)
+        os.replace(rollup_path + ".tmp", rollup_path)
+        with open(state_path + ".tmp", "w") as f:
+            json.dump({"input": input_name, "months": signatures}, f)
+        os.replace(state_path + ".tmp", state_path)
+    print(f"🧮 Rebuilt {len(changed)} month(s), dropped {len(removed)}: "
+          f"{len(df)} expenses → {len(fresh)} rollup rows")
+    return changed
+
+
+# -----------------------------
+# 💱 Currency conversion
+# -----------------------------
+def load_fx_rates(path=FX_RATES_PATH):
+    """
+    Rates as month,currency,rate where rate is the value of 1 unit in a common
+    reference currency. A blank month applies to every month without its own rate.
+    """
+    import pandas as pd
+
+    if not os.path.exists(path):
+        print(f"⚠️ No FX table at {path}; only {BASE_CURRENCY} amounts will be converted.")
+        return pd.DataFrame({"month": [""], "currency": [BASE_CURRENCY], "rate": [1.0]})
+    return pd.read_csv(path, dtype={"month": str, "currency": str}, keep_default_na=False)
+
+
+def conversion_factors(months, currencies, fx, base=BASE_CURRENCY):
+    """Factor per (month, currency) row turning native amounts into `base`; NaN where no rate is known."""
+    import pandas as pd
+
+    monthly = dict(zip(zip(fx["month"], fx["currency"]), fx["rate"].astype(float)))
+    default = {c: r for m, c, r in zip(fx["month"], fx["currency"], fx["rate"].astype(float)) if m == ""}
+
+    def rate(month, currency):
+        return monthly.get((month, currency), default.get(currency, np.nan))
+
+    pairs = pd.DataFrame({"month": months, "currency": currencies})
+    unique = pairs.drop_duplicates()
+    factors = {(m, c): rate(m, c) / rate(m, base) for m, c in zip(unique["month"], unique["currency"])}
+    return np.array([factors[p] for p in zip(months, currencies)], dtype=np.float64)
+
+
+# -----------------------------
+# 🔎 Querying
+# -----------------------------
+class RollupStore:
+    """
+    The rollup table held in memory as integer-coded numpy columns.
+
+    Besides the full month x category x payer x currency table, a smaller view
+    is materialized for every subset of the dimensions (e.g. month x category,
+    or payer alone), rows sorted by month. A query picks the smallest view
+    holding the dimensions it groups or filters on, slices its month range and
+    does one bincount, so it never touches raw expenses.
+    """
+
+    def __init__(self, rollup, fx=None, base=BASE_CURRENCY):
+        import pandas as pd
+
+        self.base = base
+        self.codes = {}
+        self.labels = {}
+        for dim in DIMENSIONS:
+            codes, labels = pd.factorize(rollup[dim].astype(str), sort=True)
+            self.codes[dim] = codes
+            self.labels[dim] = np.asarray(labels, dtype=object)
+        self.rows = rollup["rows"].to_numpy(dtype=np.int64)
+        fx = load_fx_rates() if fx is None else fx
+        factors = conversion_factors(rollup["month"].astype(str).to_numpy(), rollup["currency"].astype(str).to_numpy(),
+                                     fx, base)
+        self.unconverted = np.isnan(factors)
+        self.amount_base = np.where(self.unconverted, 0.0, rollup["amount"].to_numpy(dtype=np.float64) * factors)
+        self.views = {dims: self._materialize(dims)
+                      for r in range(len(DIMENSIONS) + 1) for dims in combinations(DIMENSIONS, r)}
+
+    @classmethod
+    def load(cls, rollup_path=ROLLUP_PATH, fx=None, base=BASE_CURRENCY):
+        import pandas as pd
+
+        return cls(pd.read_csv(rollup_path, keep_default_na=False), fx, base)
+
+    def _group(self, codes, dims, n_rows):
+        """Distinct combinations of the code columns (sorted, as per-dimension codes) and each row's group number."""
+        if not dims:
+            return [], np.zeros(n_rows, dtype=np.int64)
+        sizes = [len(self.labels[d]) for d in dims]
+        key = np.ravel_multi_index(codes, sizes)
+        n_keys = int(np.prod(sizes))
+        if n_keys <= DENSE_GROUP_LIMIT:
+            # A lookup table over every possible key is cheaper than sorting the keys
+            present = np.bincount(key, minlength=n_keys) > 0
+            keys = np.flatnonzero(present)
+            inverse = (np.cumsum(present) - 1)[key]
+        else:
+            keys, inverse = np.unique(key, return_inverse=True)
+        return list(np.unravel_index(keys, sizes)), inverse
+
+    def _materialize(self, dims):
+        keys, inverse = self._group([self.codes[d] for d in dims], dims, len(self.rows))
+        # Month is the leading dimension of the key, so the view comes out sorted by month
+        view = dict(zip(dims, keys))
+        view["rows"] = np.bincount(inverse, weights=self.rows).astype(np.int64)
+        view["amount"] = np.bincount(inverse, weights=self.amount_base)
+        return view
+
+    def query(self, start_month=None, end_month=None, group_by=("category",), categories=None, payers=None,
+              currencies=None):
+        """Totals in the base currency for months in [start_month, end_month] (YYYY-MM), grouped by any dimensions."""
+        import pandas as pd
+
+        group_by = list(group_by)
+        unknown = set(group_by) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Cannot group by {sorted(unknown)}; choose from {list(DIMENSIONS)}")
+        filters = {"category": categories, "paid_by": payers, "currency": currencies}
+        needed = set(group_by) | {d for d, values in filters.items() if values}
+        if start_month or end_month:
+            needed.add("month")
+        view = self.views[tuple(d for d in DIMENSIONS if d in needed)]
+
+        lo, hi = 0, len(view["rows"])
+        if "month" in view:
+            months = self.labels["month"]
+            first = np.searchsorted(months, start_month, "left") if start_month else 0
+            last = np.searchsorted(months, end_month, "right") if end_month else len(months)
+            lo, hi = np.searchsorted(view["month"], [first, last], "left")
+        mask = np.ones(hi - lo, dtype=bool)
+        for dim, values in filters.items():
+            if values:
+                mask &= np.isin(self.labels[dim], list(values))[view[dim][lo:hi]]
+        rows = view["rows"][lo:hi][mask]
+        amount = view["amount"][lo:hi][mask]
+
+        keys, inverse = self._group([view[d][lo:hi][mask] for d in group_by], group_by, len(rows))
+        result = pd.DataFrame({d: self.labels[d][idx] for d, idx in zip(group_by, keys)})
+        n_groups = len(keys[0]) if keys else 1
+        column = f"amount_{self.base.lower()}"
+        result["rows"] = np.bincount(inverse, weights=rows, minlength=n_groups).astype(np.int64)
+        result[column] = np.bincount(inverse, weights=amount, minlength=n_groups).round(2)
+        return result.sort_values(column, ascending=False, ignore_index=True)
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog,
+                                     description="Maintain and query spend rollups over categorized expenses.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    update = sub.add_parser("update", help="Re-aggregate months whose expenses changed.")
+    update.add_argument("--input", default="expenses_categorized", help="Dataset name or CSV/Parquet path.")
+    update.add_argument("--full", action="store_true", help="Rebuild every month.")
+    query = sub.add_parser("query", help="Answer a range/filter query from the rollup.")
+    query.add_argument("--from", dest="start", help="First month, YYYY-MM.")
+    query.add_argument("--to", dest="end", help="Last month, YYYY-MM.")
+    query.add_argument("--group-by", default="category", help=f"Comma-separated subset of {','.join(DIMENSIONS)}.")
+    query.add_argument("--category", action="append", help="Only these categories (repeatable).")
+    query.add_argument("--payer", action="append", help="Only these payers (repeatable).")
+    query.add_argument("--currency", action="append", help="Only expenses paid in these currencies (repeatable).")
+    query.add_argument("--base", default=BASE_CURRENCY, help="Currency to report amounts in.")
+    args = parser.parse_args(argv)
+
+    if args.command == "update":
+        metrics.start_run("analytics")
+        update_rollup(args.input, full=args.full)
+    else:
+        store = RollupStore.load(base=args.base)
+        group_by = [g for g in args.group_by.split(",") if g]
+        start = time.perf_counter()
+        result = store.query(args.start, args.end, group_by, args.category, args.payer, args.currency)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(result.to_string(index=False))
+        if store.unconverted.any():
+            print(f"⚠️ {int(store.rows[store.unconverted].sum())} expenses have no FX rate and are left out of totals")
+        print(f"⏱️ Answered in {elapsed_ms:.2f} ms from {len(store.rows)} rollup rows")
+
+
+if __name__ == "__main__":
+    main()
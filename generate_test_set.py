@@ -1,17 +1,45 @@
-import pandas as pd
+import os
+import argparse
+import storage
 
-# Load the original (non-anonymized) expenses dataset
-df = pd.read_csv("data/expenses.csv")
 
-# Drop rows with missing descriptions just in case
-df = df.dropna(subset=["description"])
+def has_labels(path):
+    """True when `path` exists and some row already has a true_category filled in."""
+    if not os.path.exists(path):
+        return False
+    import pandas as pd
 
-# Sample 100 random expense descriptions
-test_sample = df[["description"]].drop_duplicates().sample(n=100, random_state=42).reset_index(drop=True)
+    labels = pd.read_csv(path, usecols=lambda column: column == "true_category").get("true_category")
+    return labels is not None and labels.fillna("").astype(str).str.strip().ne("").any()
 
-# Add empty column for you to fill in manually
-test_sample["true_category"] = ""
 
-# Save to test_labels.csv for manual labeling
-test_sample.to_csv("test_labels.csv", index=False)
-print("✅ Saved test set with 100 random descriptions to 'test_labels.csv'")
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Sample 100 expense descriptions for manual labeling.")
+    parser.add_argument("--output", default=storage.TEST_LABELS_PATH)
+    parser.add_argument("--force", action="store_true",
+                        help="Overwrite the output even if it already holds hand-labeled rows.")
+    args = parser.parse_args(argv)
+    if not args.force and has_labels(args.output):
+        raise SystemExit(f"❌ {args.output} already holds labeled rows; pass --force to overwrite it "
+                         f"or --output to sample elsewhere")
+
+    # Load the original (non-anonymized) expenses dataset
+    df = storage.read_table("expenses", columns=["description"])
+
+    # Drop rows with missing descriptions just in case
+    df = df.dropna(subset=["description"])
+
+    # Sample 100 random expense descriptions
+    test_sample = df[["description"]].drop_duplicates().sample(n=100, random_state=42).reset_index(drop=True)
+
+    # Add empty column for you to fill in manually
+    test_sample["true_category"] = ""
+
+    # Save where the evaluators read the labels from, for manual labeling
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    test_sample.to_csv(args.output, index=False)
+    print(f"✅ Saved test set with 100 random descriptions to '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
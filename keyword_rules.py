@@ -0,0 +1,97 @@
+import os
+import re
+import numpy as np
+
+RULES_PATH = "data/keyword_rules.csv"
+
+
+class KeywordRules:
+    """
+    All category keywords compiled into one regex.
+
+    `rules` is a list of (category, keywords) in priority order. The pattern is a
+    zero-width lookahead with one named group per category, tried in priority
+    order, so scanning a description once yields every category that matches at
+    any position and the highest-priority one wins, exactly like the old if-chain.
+    """
+
+    def __init__(self, rules, word_boundary=False):
+        self.categories = []
+        alternatives = []
+        for category, keywords in rules:
+            keywords = sorted({k.strip().lower() for k in keywords if k and k.strip()}, key=len, reverse=True)
+            if not keywords:
+                continue
+            body = "|".join(re.escape(k) for k in keywords)
+            if word_boundary:
+                body = rf"\b(?:{body})\b"
+            alternatives.append(f"(?P<c{len(self.categories)}>{body})")
+            self.categories.append(category)
+        self.word_boundary = word_boundary
+        self.pattern = re.compile("(?=(?:" + "|".join(alternatives) + "))") if alternatives else None
+
+    @classmethod
+    def from_mapping(cls, category_keywords, word_boundary=False):
+        return cls(list(category_keywords.items()), word_boundary=word_boundary)
+
+    @classmethod
+    def load(cls, path=RULES_PATH, word_boundary=None):
+        """Load rules from a CSV (priority,category,keyword) or YAML file."""
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            with open(path, "r") as f:
+                data = yaml.safe_load(f)
+            rules = [(r["category"], r["keywords"]) for r in data["rules"]]
+            if word_boundary is None:
+                word_boundary = data.get("word_boundary", False)
+        else:
+            import pandas as pd
+            df = pd.read_csv(path).dropna(subset=["category", "keyword"])
+            df = df.sort_values("priority", kind="stable")
+            rules = [(cat, group["keyword"].tolist()) for cat, group in df.groupby("category", sort=False)]
+        return cls(rules, word_boundary=bool(word_boundary))
+
+    def match(self, description):
+        """Return the highest-priority category whose keyword occurs in description, or None."""
+        if self.pattern is None:
+            return None
+        best = None
+        for m in self.pattern.finditer(description.lower()):
+            i = int(m.lastgroup[1:])
+            if best is None or i < best:
+                best = i
+                if best == 0:
+                    break
+        return None if best is None else self.categories[best]
+
+    def apply(self, descriptions):
+        """Vectorized match over a whole column; returns a Series of categories (None where no rule fires)."""
+        import pandas as pd
+
+        descriptions = pd.Series(descriptions)
+        result = pd.Series([None] * len(descriptions), index=descriptions.index, dtype=object)
+        if self.pattern is None or descriptions.empty:
+            return result
+
+        # Each distinct lowered text is scanned once
+        codes, uniques = pd.factorize(descriptions.fillna("").astype(str).str.lower())
+        matches = pd.Series(uniques).str.extractall(self.pattern)
+        if matches.empty:
+            return result
+
+        hit = matches.notna().groupby(level=0).any()
+        group_cols = [f"c{i}" for i in range(len(self.categories))]
+        hit = hit.reindex(columns=group_cols, fill_value=False)
+        unique_categories = np.full(len(uniques), None, dtype=object)
+        unique_categories[hit.index.to_numpy()] = np.asarray(self.categories, dtype=object)[hit.to_numpy().argmax(axis=1)]
+
+        result[:] = unique_categories[codes]
+        return result
+
+
+def load_keyword_rules(default_mapping, path=RULES_PATH, word_boundary=False):
+    """Use the rules file when present, otherwise fall back to the in-code keyword mapping."""
+    if os.path.exists(path):
+        print(f"📜 Loading keyword rules from {path}")
+        return KeywordRules.load(path, word_boundary=word_boundary or None)
+    return KeywordRules.from_mapping(default_mapping, word_boundary=word_boundary)
@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_DIR = os.environ.get("EXPENSE_METRICS_DIR", os.path.join("data", "run_reports"))
+# node_exporter textfile collector directory; unset means no Prometheus output
+PROMETHEUS_DIR = os.environ.get("EXPENSE_PROMETHEUS_DIR")
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+PROMETHEUS_PREFIX = "expense_pipeline"
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes everywhere else
+    return round(peak / 1e6 if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def current_rss_mb():
+    """Resident set size right now; only Linux exposes it cheaply, elsewhere None."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; quantiles are the upper bound of the bucket they fall in."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= q * self.count:
+                return self.max if bound == float("inf") else bound
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": {str(b): n for b, n in zip(self.buckets, self.counts)},
+        }
+
+
+class RunReport:
+    """
+    Timings and counters for one script run.
+
+    Steps with the same name (e.g. one per streamed chunk) are aggregated, so a
+    report stays the same size however many chunks a run processes. Safe to use
+    from several threads.
+
+    Each step also records memory: rss_mb is the resident size when it last
+    finished, rss_growth_mb what it left allocated, and peak_growth_mb how far
+    it pushed the process high-water mark, which attributes the peak to a stage.
+    """
+
+    def __init__(self, script):
+        self.script = script
+        now = time.time()
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now)) + f".{int(now % 1 * 1e6):06d}Z"
+        self.start = time.perf_counter()
+        self.steps = {}
+        self.counters = {}
+        self.histograms = {}
+        self.caches = {}
+        self.memory = {}
+        self.info = {}
+        self.lock = threading.Lock()
+        self.written = False
+
+    @contextmanager
+    def step(self, name, rows=None):
+        """Time a block; set entry["rows"] inside it when the row count is only known at the end."""
+        entry = {"rows": rows}
+        rss_before, peak_before = current_rss_mb(), peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            elapsed = time.perf_counter() - start
+            rss_after, peak_after = current_rss_mb(), peak_rss_mb()
+            with self.lock:
+                step = self.steps.setdefault(name, {"seconds": 0.0, "calls": 0, "rows": 0, "rss_growth_mb": 0.0,
+                                                    "peak_growth_mb": 0.0})
+                step["seconds"] += elapsed
+                step["calls"] += 1
+                step["rows"] += entry["rows"] or 0
+                step["peak_rss_mb"] = peak_after
+                if rss_after is not None:
+                    step["rss_mb"] = max(step.get("rss_mb", 0.0), rss_after)
+                    step["rss_growth_mb"] = round(step["rss_growth_mb"] + rss_after - rss_before, 1)
+                if peak_after is not None:
+                    step["peak_growth_mb"] = round(step["peak_growth_mb"] + peak_after - peak_before, 1)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self.lock:
+            self.histograms.setdefault(name, Histogram()).observe(value)
+
+    def record_cache(self, name, stats):
+        with self.lock:
+            self.caches[name] = dict(stats)
+
+    def record_memory(self, name, nbytes):
+        """Size of one in-memory structure (a dataframe, an index), kept at its largest."""
+        with self.lock:
+            self.memory[name] = max(self.memory.get(name, 0.0), round(nbytes / 2**20, 1))
+
+    def set_info(self, **info):
+        with self.lock:
+            self.info.update(info)
+
+    def to_dict(self):
+        steps = {}
+        for name, step in self.steps.items():
+            steps[name] = dict(step, seconds=round(step["seconds"], 4))
+            if step["rows"]:
+                steps[name]["rows_per_s"] = round(step["rows"] / max(step["seconds"], 1e-9), 1)
+        return {
+            "script": self.script,
+            "started_at": self.started_at,
+            "wall_seconds": round(time.perf_counter() - self.start, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "info": self.info,
+            "steps": steps,
+            "counters": self.counters,
+            "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+            "caches": self.caches,
+            "memory_mb": self.memory,
+        }
+
+    def to_prometheus(self):
+        labels = f'script="{self.script}"'
+        report = self.to_dict()
+        lines = [
+            f"# TYPE {PROMETHEUS_PREFIX}_wall_seconds gauge",
+            f"{PROMETHEUS_PREFIX}_wall_seconds{{{labels}}} {report['wall_seconds']}",
+            f"# TYPE {PROMETHEUS_PREFIX}_peak_rss_megabytes gauge",
+            f"{PROMETHEUS_PREFIX}_peak_rss_megabytes{{{labels}}} {report['peak_rss_mb'] or 0}",
+            f"# TYPE {PROMETHEUS_PREFIX}_step_seconds gauge",
+        ]
+        lines += [f'{PROMETHEUS_PREFIX}_step_seconds{{{labels},step="{n}"}} {s["seconds"]}'
+                  for n, s in report["steps"].items()]
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_step_rows_per_second gauge")
+        lines += [f'{PROMETHEUS_PREFIX}_step_rows_per_second{{{labels},step="{n}"}} {s["rows_per_s"]}'
+                  for n, s in report["steps"].items() if "rows_per_s" in s]
+        for name, value in report["counters"].items():
+            lines += [f"# TYPE {PROMETHEUS_PREFIX}_{name}_total counter",
+                      f"{PROMETHEUS_PREFIX}_{name}_total{{{labels}}} {value}"]
+        for name, hist in self.histograms.items():
+            metric = f"{PROMETHEUS_PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, n in zip(hist.buckets, hist.counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else bound
+                lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines += [f"{metric}_sum{{{labels}}} {round(hist.sum, 6)}", f"{metric}_count{{{labels}}} {hist.count}"]
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_cache_hit_ratio gauge")
+        lines += [f'{PROMETHEUS_PREFIX}_cache_hit_ratio{{{labels},cache="{n}"}} {c.get("hit_rate", 0)}'
+                  for n, c in report["caches"].items()]
+        return "\n".join(lines) + "\n"
+
+    def write(self, report_dir=REPORT_DIR, prometheus_dir=PROMETHEUS_DIR):
+        """Write <script>_<timestamp>_<pid>.json (and <script>.prom when a textfile directory is set)."""
+        if self.written:
+            return None
+        self.written = True
+        os.makedirs(report_dir, exist_ok=True)
+        # Microseconds keep names in start order; the pid separates runs that start in the same one
+        stamp = self.started_at.replace("-", "").replace(":", "")
+        path = os.path.join(report_dir, f"{self.script}_{stamp}_{os.getpid()}.json")
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        if prometheus_dir:
+            os.makedirs(prometheus_dir, exist_ok=True)
+            prom_path = os.path.join(prometheus_dir, f"{PROMETHEUS_PREFIX}_{self.script}.prom")
+            # Write-then-rename so the collector never scrapes a half-written file
+            with open(prom_path + ".tmp", "w") as f:
+                f.write(self.to_prometheus())
+            os.replace(prom_path + ".tmp", prom_path)
+        print(f"📈 Run report saved to {path}")
+        return path
+
+
+_current = None
+
+
+def start_run(script):
+    """Begin the process-wide report; it is written at exit. Without a run the helpers below are no-ops."""
+    global _current
+    _current = RunReport(script)
+    atexit.register(_current.write)
+    return _current
+
+
+def current():
+    return _current
+
+
+@contextmanager
+def step(name, rows=None):
+    if _current is None:
+        yield {"rows": rows}
+    else:
+        with _current.step(name, rows) as entry:
+            yield entry
+
+
+def count(name, value=1):
+    if _current is not None:
+        _current.count(name, value)
+
+
+def observe(name, value):
+    if _current is not None:
+        _current.observe(name, value)
+
+
+def record_cache(name, stats):
+    if _current is not None:
+        _current.record_cache(name, stats)
+
+
+def record_memory(name, nbytes):
+    if _current is not None:
+        _current.record_memory(name, nbytes)
+
+
+def set_info(**info):
+    if _current is not None:
+        _current.set_info(**info)
+
+
+def load_reports(script, report_dir=REPORT_DIR):
+    """All saved reports for one script, oldest first."""
+    if not os.path.isdir(report_dir):
+        return []
+    prefix = f"{script}_"
+    # The timestamp suffix starts with a digit, which keeps "evaluate" from matching "evaluate_chromadb"
+    names = sorted(f for f in os.listdir(report_dir)
+                   if f.startswith(prefix) and f[len(prefix):len(prefix) + 1].isdigit() and f.endswith(".json"))
+    reports = []
+    for name in names:
+        with open(os.path.join(report_dir, name), "r") as f:
+            reports.append(json.load(f))
+    return reports
+
+
+def main(argv=None, prog=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog,
+                                     description="Compare the latest run report of a script with the one before it.")
+    parser.add_argument("script", help="Report name, e.g. categorize, anonymize, evaluate, pipeline.")
+    parser.add_argument("--report-dir", default=REPORT_DIR)
+    args = parser.parse_args(argv)
+
+    reports = load_reports(args.script, args.report_dir)
+    if not reports:
+        raise SystemExit(f"❌ No run reports for '{args.script}' in {args.report_dir}")
+    latest = reports[-1]
+    previous = reports[-2] if len(reports) > 1 else None
+    print(f"📈 {args.script}: {latest['started_at']} vs {previous['started_at'] if previous else 'no previous run'}")
+    print(f"{'step':<24} {'seconds':>9} {'previous':>9} {'change':>8} {'rows/s':>10} {'rss MB':>8} {'peak +MB':>9}")
+    rows = [("wall", latest["wall_seconds"], previous["wall_seconds"] if previous else None, {})]
+    for name, step in latest["steps"].items():
+        before = previous["steps"].get(name, {}).get("seconds") if previous else None
+        rows.append((name, step["seconds"], before, step))
+    for name, seconds, before, step in rows:
+        change = f"{(seconds - before) / before * 100:+.0f}%" if before else ""
+        print(f"{name:<24} {seconds:>9.3f} {before if before is not None else '':>9} {change:>8} "
+              f"{step.get('rows_per_s') or '':>10} {step.get('rss_mb', ''):>8} {step.get('peak_growth_mb', ''):>9}")
+    print(f"🧠 Peak RSS: {latest['peak_rss_mb']} MB")
+    for name, size in latest.get("memory_mb", {}).items():
+        print(f"   {name:<21} {size:>9.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
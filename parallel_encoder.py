@@ -0,0 +1,104 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from encoders import DEFAULT_BACKEND, DEFAULT_BATCH_SIZE, MODEL_NAME, load_model
+
+DEFAULT_SHARD_SIZE = 2000
+
+_worker_model = None
+
+
+def _init_worker(model_name, backend, threads):
+    global _worker_model
+    _worker_model = load_model(model_name, backend, threads)
+
+
+def _encode_shard(shard_index, texts, batch_size, normalize_embeddings):
+    vectors = _worker_model.encode(texts, batch_size=batch_size, normalize_embeddings=normalize_embeddings,
+                                   show_progress_bar=False)
+    return shard_index, np.asarray(vectors, dtype=np.float32)
+
+
+def _warm_up(texts, batch_size, barrier):
+    # Hold this worker until every other one has encoded too, so each task lands on a different process
+    _worker_model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+    barrier.wait()
+
+
+class ShardedEncoder:
+    """
+    SentenceTransformer.encode stand-in that splits texts into shards and encodes
+    them on a pool of worker processes, each holding its own copy of the model.
+
+    Workers are started lazily on the first encode, so wrapping this in a
+    CachedEncoder costs nothing when every text is already cached. Each worker
+    gets cpu_count // workers intra-op threads unless told otherwise, so the
+    pool does not oversubscribe the cores. Results come back in input order.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, backend=DEFAULT_BACKEND, workers=None,
+                 shard_size=DEFAULT_SHARD_SIZE, threads=None, verbose=True):
+        self.model_name = model_name
+        self.backend = backend
+        self.workers = workers or os.cpu_count()
+        self.shard_size = shard_size
+        self.threads = threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.verbose = verbose
+        self.pool = None
+
+    def start(self):
+        if self.pool is None:
+            # spawn: forking after torch has started its thread pools can deadlock
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.backend, self.threads),
+            )
+        return self
+
+    def warm_up(self, texts, batch_size=DEFAULT_BATCH_SIZE):
+        """Start every worker and have each encode `texts` once, so model loads and first calls are paid up front."""
+        self.start()
+        with multiprocessing.get_context("spawn").Manager() as manager:
+            barrier = manager.Barrier(self.workers)
+            futures = [self.pool.submit(_warm_up, list(texts), batch_size, barrier) for _ in range(self.workers)]
+            for future in futures:
+                future.result()
+        return self
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def encode(self, texts, batch_size=DEFAULT_BATCH_SIZE, normalize_embeddings=False, show_progress_bar=False):
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        self.start()
+
+        starts = range(0, len(texts), self.shard_size)
+        futures = [self.pool.submit(_encode_shard, i, texts[s:s + self.shard_size], batch_size, normalize_embeddings)
+                   for i, s in enumerate(starts)]
+        shards = [None] * len(futures)
+        done_texts = 0
+        started = time.perf_counter()
+        for done, future in enumerate(as_completed(futures), start=1):
+            i, vectors = future.result()
+            shards[i] = vectors
+            done_texts += len(vectors)
+            if self.verbose:
+                rate = done_texts / max(time.perf_counter() - started, 1e-9)
+                print(f"🧩 Shard {done}/{len(futures)} encoded ({done_texts}/{len(texts)} texts, {rate:.0f} texts/s)")
+        return np.concatenate(shards)
@@ -0,0 +1,292 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import ast
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import storage
+import metrics
+from keyword_rules import RULES_PATH
+from expense_analytics import ROLLUP_PATH
+from anonymize_users import NAME_MAPPING_PATH
+from review_queue import REVIEW_LABELS_PATH
+
+STATE_PATH = os.path.join(storage.DATA_DIR, "pipeline_state.json")
+LOG_DIR = os.path.join(storage.DATA_DIR, "pipeline_logs")
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Settings that change a stage's output without showing up in its inputs
+FINGERPRINT_ENV = ("EXPENSE_STORAGE_FORMAT", "EMBEDDING_BACKEND")
+
+
+def dataset(name):
+    return storage.resolve(name)[0]
+
+
+def local_modules(script, root=ROOT):
+    """`script` and every repo module it imports, directly or through another one, including in-function imports."""
+    seen, pending = set(), [script]
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        with open(os.path.join(root, name), "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=name)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                modules = [node.module]
+            else:
+                continue
+            for module in modules:
+                path = module.split(".")[0] + ".py"
+                if os.path.exists(os.path.join(root, path)):
+                    pending.append(path)
+    return sorted(seen)
+
+
+class Stage:
+    """
+    One pipeline step: a script run with args, the files it reads and writes,
+    the local modules whose code it depends on, and the stages that must run first.
+
+    The code fingerprint covers every repo module the script imports (see
+    local_modules); `code` only adds files it depends on without importing.
+
+    External stages pull from outside the repo (the Splitwise API), so their
+    inputs cannot be fingerprinted; they only run when forced or when an output
+    is missing. Stages naming the same entry in `exclusive` never run at the
+    same time, e.g. the stages that encode, which load the model and share the
+    embedding cache for it.
+    """
+
+    def __init__(self, name, script, inputs=(), outputs=(), code=(), deps=(), args=(), external=False,
+                 exclusive=()):
+        self.name = name
+        self.script = script
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = local_modules(script) + list(code)
+        self.deps = list(deps)
+        self.args = list(args)
+        self.external = external
+        self.exclusive = set(exclusive)
+
+    def command(self, extra_args=()):
+        return [sys.executable, os.path.join(ROOT, self.script)] + self.args + list(extra_args)
+
+
+def build_stages(encoder_args=()):
+    """The export → anonymize → categorize → evaluate DAG; paths are resolved now so storage format is honoured."""
+    # One model per backend and one embedding cache for it: the encoding stages take turns on them
+    encoding = ["embedding_cache"]
+    return {stage.name: stage for stage in [
+        Stage("export", "splitwise_export.py",
+              outputs=[dataset("expenses")],
+              external=True),
+        Stage("anonymize", "anonymize_users.py",
+              inputs=[dataset("expenses")],
+              outputs=[dataset("expenses_anonymized"), NAME_MAPPING_PATH],
+              deps=["export"],
+              args=["--incremental"]),
+        Stage("categorize", "categorize_expenses_vector_db.py",
+              inputs=[dataset("expenses_anonymized"), storage.CATEGORY_EXAMPLES_PATH, REVIEW_LABELS_PATH],
+              outputs=[dataset("expenses_categorized")],
+              deps=["anonymize"],
+              args=list(encoder_args),
+              exclusive=encoding),
+        Stage("categorize_chromadb", "splitwise_categorizer_with_chromadb.py",
+              inputs=[dataset("expenses"), RULES_PATH, REVIEW_LABELS_PATH],
+              outputs=[dataset("expenses_with_categories")],
+              deps=["export"],
+              args=list(encoder_args),
+              exclusive=encoding),
+        Stage("analytics", "expense_analytics.py",
+              inputs=[dataset("expenses_categorized")],
+              outputs=[ROLLUP_PATH],
+              deps=["categorize"],
+              args=["update"]),
+        Stage("evaluate", "evaluate_categorization.py",
+              inputs=[storage.TEST_LABELS_PATH, storage.CATEGORY_EXAMPLES_PATH],
+              outputs=[os.path.join(storage.DATA_DIR, "eval_errors.csv")],
+              args=list(encoder_args),
+              exclusive=encoding),
+    ]}
+
+
+def hash_path(digest, path):
+    """Feed a file's bytes, every file under a directory (Parquet datasets), or a missing marker into digest."""
+    digest.update(path.encode("utf-8") + b"\0")
+    if os.path.isdir(path):
+        files = sorted(os.path.join(root, f) for root, _, names in os.walk(path) for f in names)
+    elif os.path.exists(path):
+        files = [path]
+    else:
+        digest.update(b"<missing>")
+        return
+    for file_path in files:
+        digest.update(os.path.relpath(file_path, path).encode("utf-8") + b"\0")
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+
+
+def fingerprint(stage):
+    digest = hashlib.sha256()
+    for path in stage.inputs:
+        hash_path(digest, path)
+    for module in stage.code:
+        hash_path(digest, os.path.join(ROOT, module))
+    digest.update(json.dumps({"args": stage.args, "env": {k: os.environ.get(k) for k in FINGERPRINT_ENV}},
+                             sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def is_up_to_date(stage, state, current_fingerprint):
+    if not all(os.path.exists(p) for p in stage.outputs):
+        return False
+    if stage.external:
+        return True
+    return state.get(stage.name, {}).get("fingerprint") == current_fingerprint
+
+
+def select(stages, targets):
+    """Targets plus everything upstream of them, like make."""
+    selected, pending = set(), list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in stages:
+            raise SystemExit(f"❌ Unknown stage '{name}', expected one of {list(stages)}")
+        if name not in selected:
+            selected.add(name)
+            pending.extend(stages[name].deps)
+    return selected
+
+
+def run_stage(stage):
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOG_DIR, f"{stage.name}.log")
+    start = time.perf_counter()
+    with metrics.step(f"stage_{stage.name}"), open(log_path, "w") as log:
+        result = subprocess.run(stage.command(), cwd=ROOT, stdout=log, stderr=subprocess.STDOUT)
+    return result.returncode, time.perf_counter() - start, log_path
+
+
+def run_pipeline(stages, targets=None, force=(), jobs=None, dry_run=False, state_path=STATE_PATH):
+    """
+    Run the selected stages in dependency order, skipping up-to-date ones.
+
+    A stage becomes ready once all its deps have finished (run or skipped),
+    and every ready stage is started at once on a pool of `jobs` threads, so
+    independent branches overlap, unless a running stage shares one of its
+    `exclusive` entries. The encoding stages (categorize, categorize_chromadb,
+    evaluate) all claim the embedding cache and so run one after another; the
+    overlap comes from the other stages, such as analytics running beside
+    them. Fingerprints are taken when a stage becomes
+    ready, after its upstream outputs have been rewritten.
+    """
+    selected = select(stages, targets or list(stages))
+    state = load_state(state_path)
+    finished, failed, results = set(), set(), {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=jobs or len(selected)) as pool:
+        while True:
+            for name in [n for n in stages if n in selected and n not in finished | failed | set(running.values())]:
+                stage = stages[name]
+                deps = [d for d in stage.deps if d in selected]
+                if any(d in failed for d in deps):
+                    print(f"⏭️ {name}: skipped, upstream stage failed")
+                    failed.add(name)
+                    results[name] = "blocked"
+                    continue
+                if not all(d in finished for d in deps):
+                    continue
+                if any(stage.exclusive & stages[other].exclusive for other in running.values()):
+                    continue
+
+                current = fingerprint(stage)
+                upstream_changes = any(results.get(d) == "would run" for d in deps)
+                if name not in force and not upstream_changes and is_up_to_date(stage, state, current):
+                    print(f"✅ {name}: up to date")
+                    finished.add(name)
+                    results[name] = "skipped"
+                elif dry_run:
+                    print(f"📝 {name}: would run {' '.join(stage.command()[1:])}")
+                    finished.add(name)
+                    results[name] = "would run"
+                else:
+                    print(f"🚀 {name}: running...")
+                    running[pool.submit(run_stage, stage)] = name
+                    state.setdefault(name, {})["pending_fingerprint"] = current
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                returncode, elapsed, log_path = future.result()
+                entry = state[name]
+                current = entry.pop("pending_fingerprint")
+                if returncode == 0 and all(os.path.exists(p) for p in stages[name].outputs):
+                    print(f"🏁 {name}: done in {elapsed:.1f}s (log: {log_path})")
+                    entry.update({"fingerprint": current, "finished_at": time.strftime(storage.DATE_FORMAT, time.gmtime()),
+                                  "seconds": round(elapsed, 2)})
+                    finished.add(name)
+                    results[name] = "ran"
+                else:
+                    print(f"❌ {name}: failed with exit code {returncode}, see {log_path}")
+                    failed.add(name)
+                    results[name] = "failed"
+                save_state(state, state_path)
+    return results
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Run the expense pipeline, skipping stages whose inputs are unchanged.")
+    parser.add_argument("targets", nargs="*", help="Stages to bring up to date (default: all); upstream stages are included.")
+    parser.add_argument("--force", action="append", default=[], metavar="STAGE",
+                        help="Re-run this stage even if it is up to date (repeatable; 'all' for every stage).")
+    parser.add_argument("--refresh", action="store_true", help="Pull new expenses from Splitwise (forces export).")
+    parser.add_argument("--jobs", type=int, default=None, help="Max stages running at once (default: unlimited).")
+    parser.add_argument("--dry-run", action="store_true", help="Only show what would run.")
+    parser.add_argument("--backend", default=None, help="Embedding backend passed to the embedding stages.")
+    args = parser.parse_args(argv)
+    metrics.start_run("pipeline")
+
+    stages = build_stages(["--backend", args.backend] if args.backend else [])
+    force = set(stages) if "all" in args.force else set(args.force)
+    if args.refresh:
+        force.add("export")
+
+    results = run_pipeline(stages, args.targets, force, args.jobs, args.dry_run)
+    metrics.set_info(stages=results)
+    print("\n📊 Pipeline summary:")
+    for name, outcome in results.items():
+        print(f"  {name:<20} {outcome}")
+    sys.exit(1 if "failed" in results.values() or "blocked" in results.values() else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import os
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+
+import storage
+import metrics
+from encoders import MODEL_NAME, add_encoder_args
+from description_dictionary import normalize_descriptions
+
+REVIEW_QUEUE_PATH = os.path.join(storage.DATA_DIR, "review_queue.csv")
+REVIEW_LABELS_PATH = os.path.join(storage.DATA_DIR, "review_labels.csv")
+EVAL_ERRORS_PATH = os.path.join(storage.DATA_DIR, "eval_errors.csv")
+NEEDS_REVIEW = "Needs Review"
+RANKINGS = ("margin", "entropy")
+# Gap between the two best categories below which even a confident-looking match is queued
+MARGIN_THRESHOLD = 0.05
+# Softmax temperature that turns per-category similarities into the distribution entropy is taken over
+ENTROPY_TEMPERATURE = 0.05
+SCORE_CHUNK_SIZE = 4096
+
+
+# ----------------------
+# Reviewed labels: the override cache both categorizers consult first
+# ----------------------
+def load_review_labels(path=REVIEW_LABELS_PATH):
+    """Reviewed corrections as {normalized description: category}; the file is a log, so later entries win."""
+    if not path or not os.path.exists(path):
+        return {}
+    import pandas as pd
+
+    df = pd.read_csv(path).dropna(subset=["description", "category"])
+    return dict(zip(df["description"].astype(str), df["category"].astype(str)))
+
+
+def save_review_labels(corrections, path=REVIEW_LABELS_PATH):
+    """Append the corrections that differ from the current labels; returns {description: category} of those."""
+    import pandas as pd
+
+    labels = load_review_labels(path)
+    changed = {d: c for d, c in corrections.items() if labels.get(d) != c}
+    if changed:
+        reviewed_at = datetime.now(timezone.utc).strftime(storage.DATE_FORMAT)
+        df = pd.DataFrame({"description": list(changed), "category": list(changed.values()),
+                           "reviewed_at": reviewed_at})
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        df.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+    return changed
+
+
+# ----------------------
+# Uncertainty
+# ----------------------
+def category_scores(vectors, ref_vectors, ref_labels, chunk_size=SCORE_CHUNK_SIZE):
+    """Best similarity to each category's references: an (n, n_categories) matrix plus the category names."""
+    categories, codes = np.unique(np.asarray(ref_labels, dtype=str), return_inverse=True)
+    order = np.argsort(codes, kind="stable")
+    starts = np.searchsorted(codes[order], np.arange(len(categories)))
+    ref_vectors = np.ascontiguousarray(ref_vectors[order], dtype=np.float32)
+    scores = np.empty((len(vectors), len(categories)), dtype=np.float32)
+    for start in range(0, len(vectors), chunk_size):
+        similarities = vectors[start:start + chunk_size] @ ref_vectors.T
+        scores[start:start + chunk_size] = np.maximum.reduceat(similarities, starts, axis=1)
+    return scores, categories
+
+
+def uncertainty(scores):
+    """Per row of a category score matrix: (best, runner-up, margin between them, normalized entropy)."""
+    n, n_categories = scores.shape
+    if n_categories < 2:
+        return np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64), np.ones(n), np.zeros(n)
+    top = np.argsort(-scores, axis=1)[:, :2]
+    best, runner_up = top[:, 0], top[:, 1]
+    rows = np.arange(n)
+    margin = scores[rows, best] - scores[rows, runner_up]
+    logits = (scores - scores.max(axis=1, keepdims=True)) / ENTROPY_TEMPERATURE
+    p = np.exp(logits)
+    p /= p.sum(axis=1, keepdims=True)
+    entropy = -(p * np.log(np.maximum(p, 1e-12))).sum(axis=1) / np.log(n_categories)
+    return best, runner_up, margin, entropy
+
+
+# ----------------------
+# Queue
+# ----------------------
+def collect_candidates(source, errors_path=EVAL_ERRORS_PATH):
+    """
+    One row per normalized description of a categorized dataset.
+
+    Works on either categorizer's output: FAISS rows are flagged by
+    low_confidence_flag, ChromaDB rows by a "Needs Review" prediction. Wrong
+    predictions in the evaluation errors file are flagged too and carry their
+    true category as a suggestion; they do not add to the description count.
+    """
+    import pandas as pd
+
+    df = storage.read_table(source)
+    category_column = "category" if "category" in df.columns else "predicted_category"
+    flagged = df[category_column].eq(NEEDS_REVIEW)
+    if "low_confidence_flag" in df.columns:
+        flagged |= df["low_confidence_flag"].fillna(False).astype(bool)
+    frames = [pd.DataFrame({
+        "description": normalize_descriptions(df["description"]).to_numpy(),
+        "example": df["description"].fillna("").astype(str).to_numpy(),
+        "predicted_category": df[category_column].to_numpy(dtype=object),
+        "similarity_score": pd.to_numeric(df["similarity_score"], errors="coerce").to_numpy(),
+        "flagged": flagged.to_numpy(),
+        "suggested_category": None,
+        "rows": 1,
+    })]
+    if errors_path and os.path.exists(errors_path):
+        errors = pd.read_csv(errors_path).dropna(subset=["description"])
+        errors = errors[~errors["correct"].astype(bool)]
+        frames.append(pd.DataFrame({
+            "description": normalize_descriptions(errors["description"]).to_numpy(),
+            "example": errors["description"].astype(str).to_numpy(),
+            "predicted_category": errors["predicted_category"].to_numpy(dtype=object),
+            "similarity_score": errors["similarity_score"].to_numpy(),
+            "flagged": True,
+            "suggested_category": errors["true_category"].to_numpy(dtype=object),
+            "rows": 0,
+        }))
+    rows = pd.concat(frames, ignore_index=True)
+    return rows.groupby("description", sort=False).agg(
+        count=("rows", "sum"), example=("example", "first"), predicted_category=("predicted_category", "first"),
+        similarity_score=("similarity_score", "mean"), flagged=("flagged", "any"),
+        suggested_category=("suggested_category", "first"),
+    ).reset_index()
+
+
+def build_queue(candidates, model, df_reference, rank_by="margin", margin_threshold=MARGIN_THRESHOLD,
+                reviewed=None):
+    """
+    Score candidates against the reference set and rank the uncertain ones.
+
+    A description is queued when something flagged it or the gap between its two
+    best categories is under margin_threshold. Priority is its row count times
+    its uncertainty (1 - margin, or the normalized entropy), so a recurring
+    ambiguous merchant comes before a one-off.
+    """
+    if reviewed:
+        candidates = candidates[~candidates["description"].isin(list(reviewed))]
+    texts = candidates["description"].tolist()
+    with metrics.step("encode", rows=len(texts) + len(df_reference)):
+        vectors = np.asarray(model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+        ref_vectors = np.asarray(model.encode(df_reference["example"].astype(str).tolist(), normalize_embeddings=True),
+                                 dtype=np.float32)
+    with metrics.step("score", rows=len(texts)):
+        scores, categories = category_scores(vectors, ref_vectors, df_reference["category"])
+        best, runner_up, margin, entropy = uncertainty(scores)
+
+    queue = candidates.assign(
+        best_category=categories[best], runner_up=categories[runner_up],
+        margin=margin.round(4), entropy=entropy.round(4),
+    )
+    queue = queue[queue["flagged"] | (queue["margin"] < margin_threshold)]
+    spread = (1 - queue["margin"].clip(0, 1)) if rank_by == "margin" else queue["entropy"]
+    queue.insert(0, "priority", (queue["count"].clip(lower=1) * spread).round(4))
+    return queue.sort_values(["priority", "count"], ascending=False).assign(corrected_category="")
+
+
+def queued_corrections(queue, accept_suggested=False):
+    """{normalized description: category} for queue rows with a correction (or, optionally, a suggestion)."""
+    corrected = queue["corrected_category"].fillna("").astype(str).str.strip()
+    if accept_suggested:
+        suggested = queue["suggested_category"].fillna("").astype(str).str.strip()
+        corrected = corrected.where(corrected != "", suggested)
+    done = corrected != ""
+    return dict(zip(queue.loc[done, "description"].astype(str), corrected[done]))
+
+
+# ----------------------
+# Feeding corrections back
+# ----------------------
+def sync_example_index(examples_path, reviewed_path, model, index_dir):
+    """Add reviewed corrections to the FAISS example index; only the new ones are encoded."""
+    from example_index import ExampleIndex, load_reference_set
+
+    df_reference = load_reference_set(examples_path, reviewed=reviewed_path)
+    return ExampleIndex.load_or_build(df_reference, model, model.model_key, index_dir)
+
+
+def sync_chromadb(persist_dir, labels, model):
+    """Store reviewed corrections in the ChromaDB classified collection when one exists on disk."""
+    if not os.path.isdir(persist_dir):
+        return 0
+    from splitwise_categorizer_with_chromadb import open_client, open_classified, sync_review_labels
+
+    classified = open_classified(open_client(persist_dir), model, examples_changed=False)
+    return sync_review_labels(classified, model, labels)
+
+
+def main(argv=None, prog=None):
+    from example_index import INDEX_DIR
+    from splitwise_categorizer_with_chromadb import CHROMA_DIR
+
+    parser = argparse.ArgumentParser(prog=prog, description="Rank uncertain expenses for review and feed "
+                                     "corrections back into the example index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Rank flagged and ambiguous descriptions into the review queue.")
+    build.add_argument("--input", default="expenses_categorized",
+                       help="Categorized dataset (either categorizer's output).")
+    build.add_argument("--errors", default=EVAL_ERRORS_PATH, help="Evaluation errors to include ('' to skip).")
+    build.add_argument("--rank-by", choices=RANKINGS, default="margin")
+    build.add_argument("--margin", type=float, default=MARGIN_THRESHOLD,
+                       help="Queue descriptions whose top-two category gap is below this.")
+    build.add_argument("--limit", type=int, default=200, help="Descriptions kept in the queue.")
+    apply = subparsers.add_parser("apply", help="Record corrections and add them to the index and ChromaDB.")
+    apply.add_argument("--label", action="append", default=[], metavar="DESCRIPTION=CATEGORY",
+                       help="Correction given directly; may be repeated.")
+    apply.add_argument("--accept-suggested", action="store_true",
+                       help="Use the suggested (true) category of queued evaluation errors without a correction.")
+    apply.add_argument("--index-dir", default=INDEX_DIR)
+    apply.add_argument("--persist-dir", default=CHROMA_DIR)
+    for sub in (build, apply):
+        sub.add_argument("--queue", default=REVIEW_QUEUE_PATH)
+        sub.add_argument("--labels", default=REVIEW_LABELS_PATH, help="Reviewed corrections log.")
+        sub.add_argument("--examples", default=storage.CATEGORY_EXAMPLES_PATH)
+        add_encoder_args(sub)
+    args = parser.parse_args(argv)
+    metrics.start_run(f"review_{args.command}")
+    metrics.set_info(backend=args.backend)
+
+    import pandas as pd
+    from embedding_cache import CachedEncoder
+    from example_index import load_reference_set
+
+    model = CachedEncoder(MODEL_NAME, backend=args.backend, threads=args.threads, batch_size=args.batch_size)
+    if args.command == "build":
+        # 🔹 Step 1: Group the categorized rows by normalized description
+        with metrics.step("collect") as entry:
+            candidates = collect_candidates(args.input, args.errors)
+            entry["rows"] = int(candidates["count"].sum())
+        print(f"🔎 {int(candidates['count'].sum())} rows → {len(candidates)} distinct descriptions, "
+              f"{int(candidates['flagged'].sum())} flagged")
+
+        # 🔹 Step 2: Rank by uncertainty x frequency
+        reviewed = load_review_labels(args.labels)
+        df_reference = load_reference_set(args.examples, reviewed=args.labels)
+        queue = build_queue(candidates, model, df_reference, args.rank_by, args.margin, reviewed).head(args.limit)
+        os.makedirs(os.path.dirname(args.queue) or ".", exist_ok=True)
+        queue.to_csv(args.queue, index=False)
+        print(f"📝 Review queue: {len(queue)} descriptions covering {int(queue['count'].sum())} rows "
+              f"→ {args.queue}")
+        print(queue[["priority", "count", "description", "predicted_category", "best_category", "runner_up",
+                     "margin"]].head(10).to_string(index=False))
+        print("✍️ Fill in corrected_category and run the apply command.")
+    else:
+        # 🔹 Step 1: Gather corrections from the queue and the command line
+        queue = pd.read_csv(args.queue, keep_default_na=False) if os.path.exists(args.queue) else None
+        corrections = {} if queue is None else queued_corrections(queue, args.accept_suggested)
+        for item in args.label:
+            description, sep, category = item.rpartition("=")
+            if not sep or not description.strip() or not category.strip():
+                parser.error(f"--label expects DESCRIPTION=CATEGORY, got {item!r}")
+            corrections[normalize_descriptions([description])[0]] = category.strip()
+        changed = save_review_labels(corrections, args.labels)
+        print(f"✅ {len(corrections)} corrections, {len(changed)} new or changed → {args.labels}")
+
+        # 🔹 Step 2: Add them to the example index and ChromaDB without a rebuild
+        if changed:
+            with metrics.step("sync_index", rows=len(changed)):
+                sync_example_index(args.examples, args.labels, model, args.index_dir)
+            with metrics.step("sync_chromadb", rows=len(changed)):
+                synced = sync_chromadb(args.persist_dir, load_review_labels(args.labels), model)
+            print(f"🧾 {synced} reviewed descriptions stored in ChromaDB")
+        if queue is not None and corrections:
+            queue[~queue["description"].isin(list(corrections))].to_csv(args.queue, index=False)
+    model.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import json
+import time
+import random
+import argparse
+import threading
+import http.client
+
+import numpy as np
+import storage
+
+
+def run_client(host, port, descriptions, n_requests, bulk, latencies, errors, seed):
+    rng = random.Random(seed)
+    # One keep-alive connection per simulated UI client
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    for _ in range(n_requests):
+        if bulk > 1:
+            payload = {"descriptions": rng.sample(descriptions, min(bulk, len(descriptions)))}
+        else:
+            payload = {"description": rng.choice(descriptions)}
+        body = json.dumps(payload)
+        start = time.perf_counter()
+        try:
+            conn.request("POST", "/categorize", body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e))
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator for categorization_service.py.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--source", default="expenses_anonymized", help="Dataset name or CSV/Parquet path.")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent connections.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per client.")
+    parser.add_argument("--bulk", type=int, default=1, help="Descriptions per request.")
+    args = parser.parse_args()
+
+    descriptions = storage.read_table(args.source, columns=["description"])["description"].dropna().astype(str).tolist()
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=run_client, args=(args.host, args.port, descriptions, args.requests,
+                                                  args.bulk, latencies, errors, seed))
+        for seed in range(args.clients)
+    ]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies)
+    print(f"📨 {len(lat)} requests ({len(errors)} errors) from {args.clients} clients in {elapsed:.1f}s")
+    print(f"⚡ Throughput: {len(lat) / elapsed:.1f} req/s, {len(lat) * args.bulk / elapsed:.1f} descriptions/s")
+    if len(lat):
+        print(f"⏱️ Latency ms: p50={np.percentile(lat, 50):.1f}  p90={np.percentile(lat, 90):.1f}  "
+              f"p99={np.percentile(lat, 99):.1f}  max={lat.max():.1f}")
@@ -1,19 +1,24 @@
 
 import os
-import pandas as pd
-import chromadb
-from chromadb.utils import embedding_functions
-from sentence_transformers import SentenceTransformer
-from tqdm import tqdm
+import hashlib
+import argparse
+import numpy as np
+from embedding_cache import CachedEncoder
+from encoders import MODEL_NAME, add_encoder_args
+from example_index import example_id
+from keyword_rules import KeywordRules, load_keyword_rules, RULES_PATH
+from description_dictionary import DescriptionDictionary, normalize_descriptions
+from review_queue import REVIEW_LABELS_PATH, load_review_labels
+import storage
+import metrics
 
-# ----------------------
-# STEP 1: Setup ChromaDB
-# ----------------------
-client = chromadb.Client()
-collection_name = "expense_categories"
-if collection_name in [c.name for c in client.list_collections()]:
-    client.delete_collection(collection_name)
-collection = client.create_collection(collection_name)
+LOW_CONFIDENCE_THRESHOLD = 0.45
+QUERY_CHUNK_SIZE = 1000
+CHROMA_DIR = os.path.join(storage.DATA_DIR, "chromadb")
+EXAMPLES_COLLECTION = "expense_categories"
+CLASSIFIED_COLLECTION = "classified_descriptions"
+# Cosine similarity above which an earlier classified description is reused as-is
+NEAR_DUPLICATE_SIMILARITY = 0.95
 
 # ----------------------
 # STEP 2: Define categories & examples
@@ -30,84 +35,329 @@ category_examples = {
     "Clothes + Accessories": ["jeans", "zara", "jewelry", "tshirt", "dress"],
 }
 
-# ----------------------
-# STEP 3: Embed examples into ChromaDB
-# ----------------------
-print("📥 Embedding category examples into ChromaDB...")
-model = SentenceTransformer("all-MiniLM-L6-v2")
-example_texts = []
-example_ids = []
-example_metas = []
-
-for cat, examples in category_examples.items():
-    for idx, ex in enumerate(examples):
-        example_ids.append(f"{cat}_{idx}")
-        example_texts.append(ex)
-        example_metas.append({"category": cat})
-
-collection.add(
-    documents=example_texts,
-    metadatas=example_metas,
-    ids=example_ids,
-    embeddings=model.encode(example_texts).tolist()
-)
 
 # ----------------------
-# STEP 4: Load your expenses
+# STEP 1 + 3: Setup ChromaDB and embed examples
 # ----------------------
-df = pd.read_csv("data/expenses.csv")
-descriptions = df["description"].astype(str).fillna("").tolist()
+def open_client(persist_dir=CHROMA_DIR):
+    """On-disk client under persist_dir, or an in-memory one when persist_dir is None."""
+    import chromadb
+    if persist_dir is None:
+        return chromadb.Client()
+    os.makedirs(persist_dir, exist_ok=True)
+    return chromadb.PersistentClient(path=persist_dir)
+
+
+def open_collection(client, name, model_name, metadata=None):
+    """Get or create a collection tagged with the model that embedded it; a different model starts it over."""
+    collection = client.get_or_create_collection(name, metadata=dict(metadata or {}, model=model_name))
+    stored_model = (collection.metadata or {}).get("model")
+    if stored_model != model_name:
+        print(f"♻️ Collection {name} was embedded with {stored_model}, rebuilding...")
+        client.delete_collection(name)
+        collection = client.create_collection(name, metadata=dict(metadata or {}, model=model_name))
+    return collection
+
+
+def build_collection(client, model, collection_name=EXAMPLES_COLLECTION):
+    """
+    Sync the category examples into the collection under content-hash ids.
+
+    Only examples that are new or edited get encoded and upserted, and removed
+    ones are deleted, so an unchanged example set costs no encoding at all.
+    Returns (collection, changed) where changed says whether any example moved.
+    """
+    collection = open_collection(client, collection_name, getattr(model, "model_key", MODEL_NAME))
+    current = {}
+    for cat, examples in category_examples.items():
+        for ex in examples:
+            current[str(example_id(cat, ex))] = (cat, ex)
+
+    stored = set(collection.get(include=[])["ids"])
+    added = [i for i in current if i not in stored]
+    removed = sorted(stored - set(current))
+    if removed:
+        collection.delete(ids=removed)
+    if added:
+        example_texts = [current[i][1] for i in added]
+        collection.upsert(
+            documents=example_texts,
+            metadatas=[{"category": current[i][0]} for i in added],
+            ids=added,
+            embeddings=model.encode(example_texts).tolist()
+        )
+    print(f"⚡ Example collection: +{len(added)} / -{len(removed)} examples, {len(current)} total")
+    return collection, bool(added or removed)
+
+
+def description_key(description):
+    """Id of a description in the classified collection: case and whitespace do not make a new entry."""
+    return hashlib.sha1(" ".join(str(description).lower().split()).encode("utf-8")).hexdigest()
+
+
+def open_classified(client, model, examples_changed):
+    """
+    Collection of previously classified descriptions and their final categories.
+
+    Entries the model produced (source=model) are dropped when the example set
+    changes, since the examples they were matched against are gone; entries from
+    other sources, such as reviewed corrections (source=review), are kept.
+    """
+    collection = open_collection(client, CLASSIFIED_COLLECTION, getattr(model, "model_key", MODEL_NAME),
+                                 {"hnsw:space": "cosine"})
+    if examples_changed and collection.count():
+        collection.delete(where={"source": "model"})
+        print("♻️ Example set changed, forgot earlier model classifications")
+    return collection
+
+
+def sync_review_labels(classified, model, labels, chunk_size=QUERY_CHUNK_SIZE):
+    """
+    Store reviewed corrections ({normalized description: category}) as source=review entries.
+
+    Only descriptions whose stored entry is missing, model-made or of another
+    category are encoded and upserted; returns how many that was.
+    """
+    entries = {description_key(d): (d, c) for d, c in labels.items()}
+    keys = list(entries)
+    stored = {}
+    for start in range(0, len(keys), chunk_size):
+        result = classified.get(ids=keys[start:start + chunk_size], include=["metadatas"])
+        stored.update(zip(result["ids"], result["metadatas"]))
+    pending = [k for k in keys if stored.get(k, {}).get("source") != "review"
+               or stored[k].get("category") != entries[k][1]]
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        documents = [entries[k][0] for k in chunk]
+        classified.upsert(
+            ids=chunk,
+            documents=documents,
+            metadatas=[{"category": entries[k][1], "similarity": 1.0, "source": "review"} for k in chunk],
+            embeddings=model.encode(documents).tolist(),
+        )
+    return len(pending)
+
 
 # ----------------------
 # STEP 5: Define keyword rules
 # ----------------------
+# Keywords are checked in category order; main() swaps in data/keyword_rules.csv when present
+rules = KeywordRules.from_mapping(category_examples)
+
+
 def keyword_rule(description):
-    desc = description.lower()
-    if any(k in desc for k in category_examples["Groceries"]): return "Groceries"
-    if any(k in desc for k in category_examples["Eating Out"]): return "Eating Out"
-    if any(k in desc for k in category_examples["Alcohol"]): return "Alcohol"
-    if any(k in desc for k in category_examples["Rent"]): return "Rent"
-    if any(k in desc for k in category_examples["Utilities"]): return "Utilities"
-    if any(k in desc for k in category_examples["Travel"]): return "Travel"
-    if any(k in desc for k in category_examples["Entertainment"]): return "Entertainment"
-    if any(k in desc for k in category_examples["Mobile Data"]): return "Mobile Data"
-    if any(k in desc for k in category_examples["Clothes + Accessories"]): return "Clothes + Accessories"
-    return None
+    return rules.match(description)
+
 
 # ----------------------
 # STEP 6: Categorize descriptions
 # ----------------------
-predicted = []
-similarities = []
-LOW_CONFIDENCE_THRESHOLD = 0.45
+def to_prediction(best_match, distance):
+    # Convert cosine distance to similarity
+    similarity = 1 - distance
+    if similarity < LOW_CONFIDENCE_THRESHOLD:
+        return "Needs Review", round(similarity, 3)
+    return best_match, round(similarity, 3)
 
-print("🔍 Classifying descriptions...")
-for desc in tqdm(descriptions):
-    rule_cat = keyword_rule(desc)
-    if rule_cat:
-        predicted.append(rule_cat)
-        similarities.append(1.0)
-        continue
 
-    query_vec = model.encode(desc).tolist()
-    result = collection.query(query_embeddings=[query_vec], n_results=1)
-    best_match = result['metadatas'][0][0]['category']
-    similarity_score = result['distances'][0][0]  # cosine distance
+def classify_descriptions_loop(descriptions, model, collection):
+    """Original one-query-per-row path, kept as the benchmark baseline."""
+    from tqdm import tqdm
 
-    # Convert cosine distance to similarity
-    similarity = 1 - similarity_score
-    if similarity < LOW_CONFIDENCE_THRESHOLD:
-        predicted.append("Needs Review")
-    else:
-        predicted.append(best_match)
-    similarities.append(round(similarity, 3))
+    predicted = []
+    similarities = []
+    for desc in tqdm(descriptions):
+        rule_cat = keyword_rule(desc)
+        if rule_cat:
+            predicted.append(rule_cat)
+            similarities.append(1.0)
+            continue
 
-df["predicted_category"] = predicted
-df["similarity_score"] = similarities
+        query_vec = model.encode(desc).tolist()
+        result = collection.query(query_embeddings=[query_vec], n_results=1)
+        category, similarity = to_prediction(result['metadatas'][0][0]['category'], result['distances'][0][0])
+        predicted.append(category)
+        similarities.append(similarity)
+    return predicted, similarities
 
-# ----------------------
-# STEP 7: Save results
-# ----------------------
-output_path = "data/expenses_with_categories.csv"
-df.to_csv(output_path, index=False)
-print(f"✅ Categorized data saved to {output_path}")
+
+def lookup_classified(classified, keys, chunk_size=QUERY_CHUNK_SIZE):
+    """Exact matches in the classified collection: {key: (category, similarity)}."""
+    found = {}
+    for start in range(0, len(keys), chunk_size):
+        result = classified.get(ids=keys[start:start + chunk_size], include=["metadatas"])
+        for key, meta in zip(result["ids"], result["metadatas"]):
+            found[key] = (meta["category"], meta["similarity"])
+    return found
+
+
+def classify_descriptions(descriptions, model, collection, chunk_size=QUERY_CHUNK_SIZE, classified=None,
+                          overrides=None):
+    """
+    Apply reviewed corrections and keyword rules, then encode every miss in one
+    batched call and query ChromaDB in chunks of `chunk_size` vectors,
+    scattering results back into the original row order.
+
+    `overrides` maps normalized descriptions to reviewed categories; they win
+    over keyword rules since a person chose them.
+
+    With a `classified` collection, descriptions seen before take their stored
+    category without being encoded, near-duplicates (cosine similarity of at
+    least NEAR_DUPLICATE_SIMILARITY) take their neighbour's category, and new
+    confident predictions are stored for the next run.
+    """
+    from tqdm import tqdm
+
+    with metrics.step("keyword_rules", rows=len(descriptions)):
+        rule_cats = rules.apply(descriptions)
+    predicted = rule_cats.tolist()
+    if overrides:
+        with metrics.step("review_overrides", rows=len(descriptions)):
+            reviewed = normalize_descriptions(descriptions).map(overrides)
+        for i in reviewed.index[reviewed.notna()]:
+            predicted[i] = reviewed[i]
+        metrics.count("review_override_hits", int(reviewed.notna().sum()))
+    similarities = [1.0 if cat else None for cat in predicted]
+    misses = [i for i, cat in enumerate(predicted) if not cat]
+
+    if classified is not None and misses:
+        keys = [description_key(descriptions[i]) for i in misses]
+        with metrics.step("exact_lookup", rows=len(misses)):
+            found = lookup_classified(classified, list(dict.fromkeys(keys)), chunk_size)
+        for i, key in zip(misses, keys):
+            if key in found:
+                predicted[i], similarities[i] = found[key]
+        metrics.count("exact_duplicate_hits", sum(key in found for key in keys))
+        misses = [i for i, key in zip(misses, keys) if key not in found]
+
+    if not misses:
+        return predicted, similarities
+
+    with metrics.step("encode", rows=len(misses)):
+        query_vecs = model.encode([descriptions[i] for i in misses])
+
+    if classified is not None and classified.count():
+        near = 0
+        unmatched = []
+        for start in range(0, len(misses), chunk_size):
+            rows = misses[start:start + chunk_size]
+            with metrics.step("near_duplicate_query", rows=len(rows)):
+                result = classified.query(
+                    query_embeddings=query_vecs[start:start + chunk_size].tolist(),
+                    n_results=1,
+                    include=["metadatas", "distances"],
+                )
+            for j, (i, metas, distances) in enumerate(zip(rows, result['metadatas'], result['distances'])):
+                if 1 - distances[0] >= NEAR_DUPLICATE_SIMILARITY:
+                    predicted[i], similarities[i] = metas[0]["category"], metas[0]["similarity"]
+                    near += 1
+                else:
+                    unmatched.append(start + j)
+        metrics.count("near_duplicate_hits", near)
+        misses = [misses[j] for j in unmatched]
+        query_vecs = query_vecs[unmatched]
+        if not misses:
+            return predicted, similarities
+
+    for start in tqdm(range(0, len(misses), chunk_size)):
+        rows = misses[start:start + chunk_size]
+        with metrics.step("query", rows=len(rows)):
+            result = collection.query(
+                query_embeddings=query_vecs[start:start + chunk_size].tolist(),
+                n_results=1,
+                include=["metadatas", "distances"],
+            )
+        for i, metas, distances in zip(rows, result['metadatas'], result['distances']):
+            predicted[i], similarities[i] = to_prediction(metas[0]['category'], distances[0])
+
+    if classified is not None:
+        remember_classified(classified, descriptions, misses, query_vecs, predicted, similarities, chunk_size)
+    return predicted, similarities
+
+
+def remember_classified(classified, descriptions, rows, vectors, predicted, similarities, chunk_size=QUERY_CHUNK_SIZE):
+    """Store confident model predictions (one per distinct description) in the classified collection."""
+    entries = {}
+    for j, i in enumerate(rows):
+        if predicted[i] != "Needs Review":
+            entries.setdefault(description_key(descriptions[i]), (j, i))
+    keys = list(entries)
+    with metrics.step("remember_classified", rows=len(keys)):
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            picks = [entries[k] for k in chunk]
+            classified.upsert(
+                ids=chunk,
+                documents=[descriptions[i] for _, i in picks],
+                metadatas=[{"category": predicted[i], "similarity": similarities[i], "source": "model"}
+                           for _, i in picks],
+                embeddings=vectors[[j for j, _ in picks]].tolist(),
+            )
+    print(f"🧾 Remembered {len(keys)} newly classified descriptions")
+
+
+def main(argv=None, prog=None):
+    global rules
+    parser = argparse.ArgumentParser(prog=prog, description="Categorize expenses with keyword rules and ChromaDB.")
+    parser.add_argument("--rules", default=RULES_PATH, help="CSV or YAML keyword rules file.")
+    parser.add_argument("--word-boundary", action="store_true", help="Only match keywords as whole words.")
+    parser.add_argument("--persist-dir", default=CHROMA_DIR, help="Where the ChromaDB collections are kept.")
+    parser.add_argument("--in-memory", action="store_true",
+                        help="Use a throwaway in-memory client (re-embeds every example, no history).")
+    parser.add_argument("--no-history", action="store_true",
+                        help="Do not look up or store previously classified descriptions.")
+    parser.add_argument("--reviewed", default=REVIEW_LABELS_PATH,
+                        help="Reviewed corrections that override matching descriptions ('' to ignore them).")
+    add_encoder_args(parser)
+    args = parser.parse_args(argv)
+    metrics.start_run("categorize_chromadb")
+    metrics.set_info(backend=args.backend, persistent=not args.in_memory, history=not args.no_history)
+    rules = load_keyword_rules(category_examples, args.rules, word_boundary=args.word_boundary)
+
+    # ----------------------
+    # STEP 1 + 3: Setup ChromaDB and embed examples
+    # ----------------------
+    print("📥 Syncing category examples into ChromaDB...")
+    client = open_client(None if args.in_memory else args.persist_dir)
+    model = CachedEncoder(MODEL_NAME, backend=args.backend, threads=args.threads, batch_size=args.batch_size)
+    with metrics.step("build_collection"):
+        collection, examples_changed = build_collection(client, model)
+    classified = None if args.no_history or args.in_memory else open_classified(client, model, examples_changed)
+    overrides = load_review_labels(args.reviewed)
+    if classified is not None and overrides:
+        with metrics.step("sync_reviewed", rows=len(overrides)):
+            synced = sync_review_labels(classified, model, overrides)
+        print(f"✍️ {len(overrides)} reviewed corrections, {synced} newly stored in ChromaDB")
+
+    # ----------------------
+    # STEP 4: Load your expenses
+    # ----------------------
+    with metrics.step("read") as entry:
+        df = storage.read_table("expenses")
+        entry["rows"] = len(df)
+    metrics.record_memory("expenses_frame", df.memory_usage(deep=True).sum())
+    # Each distinct description is held and classified once, then spread back to its rows
+    with metrics.step("dedup", rows=len(df)):
+        dictionary = DescriptionDictionary(df["description"], normalize=False)
+
+    # ----------------------
+    # STEP 6: Categorize descriptions
+    # ----------------------
+    print(f"🔍 Classifying {len(dictionary)} distinct descriptions...")
+    predicted, similarities = classify_descriptions(dictionary.uniques, model, collection, classified=classified,
+                                                    overrides=overrides)
+
+    df["predicted_category"] = dictionary.broadcast_categorical(predicted)
+    df["similarity_score"] = dictionary.broadcast(np.asarray(similarities, dtype=np.float32))
+
+    # ----------------------
+    # STEP 7: Save results
+    # ----------------------
+    with metrics.step("write", rows=len(df)):
+        output_path = storage.write_table(df, "expenses_with_categories")
+    print(f"✅ Categorized data saved to {output_path}")
+    model.report()
+
+
+if __name__ == "__main__":
+    main()
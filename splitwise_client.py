@@ -0,0 +1,165 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+API_BASE_URL = "https://secure.splitwise.com/api/v3.0"
+PAGE_SIZE = 500
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every worker of a client."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop handing out tokens to all workers, e.g. after a 429."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def expense_row_from_json(e):
+    """Flatten a raw API expense into the same row shape as splitwise_export.expense_to_row."""
+    users = e.get("users") or []
+    paid_by = "Unknown"
+    if users:
+        user_obj = users[0].get("user") or users[0]
+        paid_by = user_obj.get("first_name") or "Unknown"
+
+    return {
+        "id": e["id"],
+        "date": str(e.get("date")),
+        "amount": e.get("cost"),
+        "currency": e.get("currency_code"),
+        "paid_by": paid_by,
+        "description": e.get("description"),
+        "updated_at": str(e.get("updated_at")),
+        "deleted_at": e.get("deleted_at"),
+    }
+
+
+class SplitwiseHTTPClient:
+    """
+    Concurrent Splitwise fetcher over pooled keep-alive connections.
+
+    Groups and friends are enumerated first, then each one's expense pages are
+    fetched on a bounded thread pool. Every request goes through one shared
+    token bucket, and 429/503 responses pause the bucket for Retry-After.
+    """
+
+    def __init__(self, auth=None, base_url=API_BASE_URL, max_workers=8,
+                 requests_per_second=10.0, burst=10, max_retries=5, timeout=30):
+        self.auth = auth
+        self.base_url = base_url.rstrip("/")
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.bucket = TokenBucket(requests_per_second, burst)
+        # One adapter (and so one urllib3 pool) shared by every thread's session
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.local = threading.local()
+
+    def session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.auth = self.auth
+            session.mount("http://", self.adapter)
+            session.mount("https://", self.adapter)
+            self.local.session = session
+        return session
+
+    def get(self, path, params=None):
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            start = time.perf_counter()
+            response = self.session().get(url, params=params, timeout=self.timeout)
+            metrics.observe("http_request_seconds", time.perf_counter() - start)
+            if response.status_code in (429, 503) and attempt < self.max_retries:
+                metrics.count("http_retries")
+                wait = parse_retry_after(response.headers.get("Retry-After"))
+                if wait is None:
+                    wait = min(60.0, 2 ** attempt)
+                self.bucket.pause(wait)
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def get_groups(self):
+        return self.get("get_groups").get("groups", [])
+
+    def get_friends(self):
+        return self.get("get_friends").get("friends", [])
+
+    def fetch_scope(self, scope, updated_after=None, page_size=PAGE_SIZE):
+        """Fetch every expense page for one group or friend."""
+        rows = []
+        offset = 0
+        while True:
+            params = dict(scope, limit=page_size, offset=offset)
+            if updated_after:
+                params["updated_after"] = updated_after
+            page = self.get("get_expenses", params).get("expenses", [])
+            rows.extend(expense_row_from_json(e) for e in page)
+            if len(page) < page_size:
+                return rows
+            offset += page_size
+
+    def fetch_expenses(self, updated_after=None, page_size=PAGE_SIZE):
+        """Fetch all groups and friends concurrently and merge into one list ordered newest first."""
+        scopes = [{"group_id": g["id"]} for g in self.get_groups()]
+        scopes += [{"friend_id": f["id"]} for f in self.get_friends()]
+        print(f"🌐 Fetching {len(scopes)} groups/friends with {self.max_workers} workers...")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = list(pool.map(lambda s: self.fetch_scope(s, updated_after, page_size), scopes))
+
+        # The same expense shows up under its group and under each friend; keep the newest copy
+        merged = {}
+        for rows in results:
+            for row in rows:
+                current = merged.get(row["id"])
+                if current is None or row["updated_at"] > current["updated_at"]:
+                    merged[row["id"]] = row
+        return sorted(merged.values(), key=lambda r: (r["date"], r["id"]), reverse=True)
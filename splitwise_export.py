@@ -1,26 +1,35 @@
 import os
 import json
+import argparse
 import webbrowser
-import pandas as pd
-from requests_oauthlib import OAuth1Session
 import urllib.parse
-from splitwise import Splitwise
+import storage
+import metrics
 
-# Load credentials
-with open("credentials.json", "r") as f:
-    creds = json.load(f)
-
-CONSUMER_KEY = creds["consumer_key"]
-CONSUMER_SECRET = creds["consumer_secret"]
+CREDENTIALS_FILE = "credentials.json"
 TOKEN_FILE = "access_token.json"
+EXPENSES_DATASET = "expenses"
+SYNC_STATE_PATH = "data/sync_state.json"
+PAGE_SIZE = 500
+EXPENSE_COLUMNS = ["id", "date", "amount", "currency", "paid_by", "description", "updated_at"]
 
 REQUEST_TOKEN_URL = "https://secure.splitwise.com/api/v3.0/get_request_token"
 AUTHORIZE_URL = "https://secure.splitwise.com/authorize"
 ACCESS_TOKEN_URL = "https://secure.splitwise.com/api/v3.0/get_access_token"
 
 
+def load_credentials():
+    with open(CREDENTIALS_FILE, "r") as f:
+        creds = json.load(f)
+    return creds["consumer_key"], creds["consumer_secret"]
+
+
 def authenticate():
+    from requests_oauthlib import OAuth1Session
+    from splitwise import Splitwise
+
     print("🔐 Starting OAuth1 flow...")
+    CONSUMER_KEY, CONSUMER_SECRET = load_credentials()
 
     oauth = OAuth1Session(CONSUMER_KEY, client_secret=CONSUMER_SECRET)
     fetch_response = oauth.fetch_request_token(REQUEST_TOKEN_URL)
@@ -67,43 +76,188 @@ def authenticate():
 
 
 def load_authenticated_splitwise():
+    from splitwise import Splitwise
+
     if os.path.exists(TOKEN_FILE):
         with open(TOKEN_FILE, "r") as f:
             token = json.load(f)
+        CONSUMER_KEY, CONSUMER_SECRET = load_credentials()
         sObj = Splitwise(CONSUMER_KEY, CONSUMER_SECRET)
         sObj.setAccessToken(token)
         return sObj
     else:
         return authenticate()
 
-def fetch_and_save_expenses():
-    sw = load_authenticated_splitwise()
-    all_expenses = sw.getExpenses(limit=1000)
-
-    expense_list = []
-    for e in all_expenses:
-        users = e.getUsers()
-        if users and len(users) > 0:
-            first_user = users[0]
-            # Sometimes getUser() may be missing; try accessing user directly
-            user_obj = first_user.getUser() if callable(getattr(first_user, "getUser", None)) else first_user
-            paid_by = user_obj.getFirstName() if callable(getattr(user_obj, "getFirstName", None)) else "Unknown"
+def expense_to_row(e):
+    users = e.getUsers()
+    if users and len(users) > 0:
+        first_user = users[0]
+        # Sometimes getUser() may be missing; try accessing user directly
+        user_obj = first_user.getUser() if callable(getattr(first_user, "getUser", None)) else first_user
+        paid_by = user_obj.getFirstName() if callable(getattr(user_obj, "getFirstName", None)) else "Unknown"
+    else:
+        paid_by = "Unknown"
+
+    return {
+        "id": e.getId(),
+        "date": str(e.getDate()),
+        "amount": e.getCost(),
+        "currency": e.getCurrencyCode(),
+        "paid_by": paid_by,
+        "description": e.getDescription(),
+        "updated_at": str(e.getUpdatedAt()),
+        "deleted_at": e.getDeletedAt(),
+    }
+
+
+def iter_expense_pages(sw, updated_after=None, page_size=PAGE_SIZE):
+    """Yield pages of expenses until Splitwise returns a short page."""
+    offset = 0
+    while True:
+        page = sw.getExpenses(offset=offset, limit=page_size, updated_after=updated_after)
+        page = list(page or [])
+        if page:
+            yield page
+        if len(page) < page_size:
+            break
+        offset += page_size
+
+
+def iter_expense_records(source, updated_after=None, page_size=PAGE_SIZE):
+    """Yield row dicts (plus deleted_at) from either a Splitwise SDK object or a SplitwiseHTTPClient."""
+    if hasattr(source, "fetch_expenses"):
+        yield from source.fetch_expenses(updated_after=updated_after, page_size=page_size)
+        return
+    for page in iter_expense_pages(source, updated_after=updated_after, page_size=page_size):
+        for e in page:
+            yield expense_to_row(e)
+
+
+def load_sync_state(state_path=SYNC_STATE_PATH):
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path, "r") as f:
+        return json.load(f)
+
+
+def save_sync_state(state, state_path=SYNC_STATE_PATH):
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def load_stored_expenses(dataset=EXPENSES_DATASET):
+    if not os.path.exists(storage.resolve(dataset)[0]):
+        return None
+    df = storage.read_table(dataset)
+    # Files written before sync mode have no ids and cannot be upserted
+    if "id" not in df.columns:
+        return None
+    return df
+
+
+def sync_expenses(source, dataset=EXPENSES_DATASET, state_path=SYNC_STATE_PATH, full=False, page_size=PAGE_SIZE):
+    """
+    Page through expenses updated since the last sync and upsert them into `dataset`.
+
+    `source` is either a SplitwiseHTTPClient or anything with a Splitwise-style
+    getExpenses(offset=, limit=, updated_after=), so a local fake client can
+    stand in for the real API.
+    """
+    import pandas as pd
+
+    state = {} if full else load_sync_state(state_path)
+    stored = None if full else load_stored_expenses(dataset)
+    if stored is None:
+        state = {}
+
+    updated_after = state.get("last_updated_at")
+    known_ids = set(state.get("expense_ids", []))
+    print(f"🔄 Syncing expenses updated after: {updated_after or 'beginning of history'}")
+
+    changed = {}
+    deleted = set()
+    high_water_mark = updated_after
+    with metrics.step("fetch") as entry:
+        for row in iter_expense_records(source, updated_after=updated_after, page_size=page_size):
+            expense_id = row["id"]
+            if row["deleted_at"]:
+                deleted.add(expense_id)
+                changed.pop(expense_id, None)
+            else:
+                changed[expense_id] = row
+                deleted.discard(expense_id)
+            if high_water_mark is None or row["updated_at"] > high_water_mark:
+                high_water_mark = row["updated_at"]
+        entry["rows"] = len(changed) + len(deleted)
+
+    with metrics.step("merge", rows=len(changed)):
+        new_rows = storage.apply_schema(pd.DataFrame(list(changed.values()), columns=EXPENSE_COLUMNS))
+        if stored is not None:
+            keep = ~stored["id"].isin(set(changed) | deleted)
+            df = pd.concat([stored[keep], new_rows], ignore_index=True)
         else:
-            paid_by = "Unknown"
+            df = new_rows
+
+        if not df.empty:
+            df = df.sort_values(["date", "id"], ascending=False).reset_index(drop=True)
+
+    with metrics.step("write", rows=len(df)):
+        output_path = storage.write_table(df, dataset)
+
+    stored_ids = set(df["id"].tolist()) if not df.empty else set()
+    save_sync_state({
+        "last_updated_at": high_water_mark,
+        "expense_ids": sorted(stored_ids),
+    }, state_path)
+
+    summary = {
+        "new": len(set(changed) - known_ids),
+        "updated": len(set(changed) & known_ids),
+        "deleted": len(deleted & known_ids),
+        "total": len(df),
+    }
+    print(f"✅ Sync complete: {summary['new']} new, {summary['updated']} updated, "
+          f"{summary['deleted']} deleted, {summary['total']} stored")
+    print(f"💾 Saved expenses to {output_path}")
+    return summary
+
+
+def load_http_client(max_workers=8):
+    from requests_oauthlib import OAuth1
+    from splitwise_client import SplitwiseHTTPClient
+
+    if not os.path.exists(TOKEN_FILE):
+        authenticate()
+    with open(TOKEN_FILE, "r") as f:
+        token = json.load(f)
+    CONSUMER_KEY, CONSUMER_SECRET = load_credentials()
+    auth = OAuth1(CONSUMER_KEY, client_secret=CONSUMER_SECRET,
+                  resource_owner_key=token["oauth_token"],
+                  resource_owner_secret=token["oauth_token_secret"])
+    return SplitwiseHTTPClient(auth=auth, max_workers=max_workers)
+
+
+def fetch_and_save_expenses(full=False, concurrent=False, workers=8):
+    source = load_http_client(max_workers=workers) if concurrent else load_authenticated_splitwise()
+    sync_expenses(source, full=full)
 
-        expense_list.append({
-            "date": str(e.getDate()),
-            "amount": e.getCost(),
-            "currency": e.getCurrencyCode(),
-            "paid_by": paid_by,
-            "description": e.getDescription(),
-        })
 
-    df = pd.DataFrame(expense_list)
-    os.makedirs("data", exist_ok=True)
-    df.to_csv("data/expenses.csv", index=False)
-    print("💾 Saved expenses to data/expenses.csv")
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Export Splitwise expenses to CSV.")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the saved sync state and re-download the whole history.")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="Fetch every group and friend in parallel over the REST API.")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Number of parallel fetch workers for --concurrent.")
+    args = parser.parse_args(argv)
+    metrics.start_run("export")
+    metrics.set_info(full=args.full, concurrent=args.concurrent, workers=args.workers)
+    fetch_and_save_expenses(full=args.full, concurrent=args.concurrent, workers=args.workers)
 
 
 if __name__ == "__main__":
-    fetch_and_save_expenses()
+    main()
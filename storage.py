@@ -0,0 +1,176 @@
+import os
+import shutil
+import argparse
+
+DATA_DIR = "data"
+FORMATS = ("csv", "parquet")
+# Which format stages write when given a dataset name; reads fall back to whatever exists
+DEFAULT_FORMAT = os.environ.get("EXPENSE_STORAGE_FORMAT", "csv")
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# Hand-edited inputs every stage reads from the same place
+CATEGORY_EXAMPLES_PATH = os.path.join(DATA_DIR, "category_examples.csv")
+TEST_LABELS_PATH = os.path.join(DATA_DIR, "test_labels.csv")
+
+# Explicit column types shared by every stage's dataset. Low-cardinality text is
+# categorical (one small code per row); descriptions stay strings and are interned
+# where they are processed (see description_dictionary).
+COLUMN_TYPES = {
+    "id": "Int64",
+    "date": "datetime64[ns, UTC]",
+    "amount": "float64",
+    "currency": "category",
+    "paid_by": "category",
+    "description": "string",
+    "updated_at": "string",
+    "low_confidence_flag": "boolean",
+    "category": "category",
+    "matched_example": "category",
+    "similarity_score": "float32",
+    "margin": "float32",
+    "predicted_category": "category",
+}
+
+SCHEMAS = {
+    "expenses": ["id", "date", "amount", "currency", "paid_by", "description", "updated_at"],
+    "expenses_anonymized": ["id", "date", "amount", "currency", "paid_by", "description", "updated_at"],
+    "expenses_categorized": ["id", "date", "amount", "currency", "paid_by", "description", "updated_at",
+                             "low_confidence_flag", "category", "matched_example", "similarity_score"],
+    "expenses_with_categories": ["id", "date", "amount", "currency", "paid_by", "description", "updated_at",
+                                 "predicted_category", "similarity_score"],
+}
+
+
+def resolve(name, fmt=None, data_dir=DATA_DIR):
+    """
+    Map a dataset name ("expenses") or an explicit file path to (path, format).
+
+    For bare names the requested format wins when that file exists, otherwise
+    whichever format is on disk is used, so CSV and Parquet stages can be mixed.
+    """
+    for ext in FORMATS:
+        if name.endswith("." + ext):
+            return name, ext
+
+    candidates = {ext: os.path.join(data_dir, f"{name}.{ext}") for ext in FORMATS}
+    fmt = fmt or DEFAULT_FORMAT
+    if not os.path.exists(candidates[fmt]):
+        for other in FORMATS:
+            if os.path.exists(candidates[other]):
+                return candidates[other], other
+    return candidates[fmt], fmt
+
+
+def require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("Parquet storage needs pyarrow: pip install pyarrow")
+
+
+def parse_types():
+    """CSV dtypes for the schema columns, so text is typed while parsing rather than as a second object copy."""
+    return {col: dtype for col, dtype in COLUMN_TYPES.items() if col != "date"}
+
+
+def apply_schema(df):
+    import pandas as pd
+
+    types = {col: dtype for col, dtype in COLUMN_TYPES.items() if col in df.columns}
+    if "date" in types:
+        df["date"] = pd.to_datetime(df["date"], utc=True, errors="coerce")
+        del types["date"]
+    return df.astype(types)
+
+
+def read_table(name, columns=None, fmt=None, data_dir=DATA_DIR):
+    """Read a dataset with typed columns; `columns` limits parsing to just those columns."""
+    import pandas as pd
+
+    path, fmt = resolve(name, fmt, data_dir)
+    if fmt == "parquet":
+        require_pyarrow()
+        df = pd.read_parquet(path, columns=columns)
+        # The month partition key is a storage detail, not part of the schema
+        if "month" in df.columns and (columns is None or "month" not in columns):
+            df = df.drop(columns="month")
+    else:
+        df = pd.read_csv(path, usecols=columns, dtype=parse_types())
+    return apply_schema(df)
+
+
+def iter_table(name, chunksize, skip_rows=0, fmt=None, data_dir=DATA_DIR):
+    """Yield typed chunks of at most `chunksize` rows, starting after `skip_rows` rows."""
+    import pandas as pd
+
+    path, fmt = resolve(name, fmt, data_dir)
+    if fmt == "csv":
+        for chunk in pd.read_csv(path, chunksize=chunksize, skiprows=range(1, skip_rows + 1), dtype=parse_types()):
+            yield apply_schema(chunk)
+        return
+
+    require_pyarrow()
+    import pyarrow.dataset as ds
+    seen = 0
+    for batch in ds.dataset(path, format="parquet", partitioning="hive").to_batches(batch_size=chunksize):
+        if seen + batch.num_rows <= skip_rows:
+            seen += batch.num_rows
+            continue
+        chunk = batch.to_pandas().iloc[max(0, skip_rows - seen):]
+        seen += batch.num_rows
+        yield apply_schema(chunk.drop(columns="month", errors="ignore"))
+
+
+def write_table(df, name, fmt=None, data_dir=DATA_DIR):
+    """Write a dataset; Parquet output is partitioned by month of `date`."""
+    if name.endswith(tuple("." + ext for ext in FORMATS)):
+        path, fmt = resolve(name)
+    else:
+        # A bare name always writes the requested format, even if the other one exists
+        fmt = fmt or DEFAULT_FORMAT
+        path = os.path.join(data_dir, f"{name}.{fmt}")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    df = apply_schema(df.copy())
+    if name in SCHEMAS:
+        ordered = [c for c in SCHEMAS[name] if c in df.columns]
+        df = df[ordered + [c for c in df.columns if c not in ordered]]
+
+    if fmt == "csv":
+        df.to_csv(path, index=False, date_format=DATE_FORMAT)
+        return path
+
+    require_pyarrow()
+    if "date" in df.columns:
+        df["month"] = df["date"].dt.strftime("%Y-%m").fillna("unknown")
+        partition_cols = ["month"]
+    else:
+        partition_cols = None
+    # Partitioned writes add files to an existing directory, so build a fresh one and swap it in
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    df.to_parquet(tmp_path, index=False, partition_cols=partition_cols)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Convert pipeline datasets between CSV and Parquet.")
+    parser.add_argument("datasets", nargs="*", default=list(SCHEMAS), help="Dataset names (default: all).")
+    parser.add_argument("--to", choices=FORMATS, required=True)
+    args = parser.parse_args(argv)
+
+    source_fmt = "csv" if args.to == "parquet" else "parquet"
+    for name in args.datasets:
+        path, fmt = resolve(name, source_fmt)
+        if not os.path.exists(path):
+            print(f"⚠️ Skipping {name}: nothing on disk")
+            continue
+        out = write_table(read_table(path), name, fmt=args.to)
+        print(f"💾 {path} → {out}")
+
+
+if __name__ == "__main__":
+    main()